@@ -10,9 +10,20 @@ import platform
 import time
 import sys
 import re
+import stat
+import heapq
+import array
+import math
+import mmap
+import random
+import hashlib
 import logging
+import argparse
+import contextlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import wraps, lru_cache
 
 # --- CONFIGURACIÓN DE LOGGING --- #
 logging.basicConfig(
@@ -38,6 +49,53 @@ Respuestas deben ser SOLO JSON sin texto adicional.
 OLLAMA_TIMEOUT = 300  # 5 minutos
 MAX_RETRIES = 2  # Reintentos para conexiones fallidas
 
+# --- CONFIGURACIÓN DEL MODO SUAVE --- #
+SUAVE_OPS_POR_SEGUNDO = 200  # Borrados/consultas de archivos por segundo
+SUAVE_RAFAGA = 50  # Operaciones permitidas de golpe antes de limitar
+SUAVE_UMBRAL_CPU = 60  # % de CPU del sistema a partir del cual se pausa
+SUAVE_UMBRAL_DISCO_MBS = 40  # MB/s de E/S de disco a partir de los cuales se pausa
+SUAVE_INTERVALO_MEDICION = 0.5  # Segundos entre mediciones de carga
+SUAVE_ESPERA_MAXIMA = 8  # Segundos máximos de cada pausa por carga del sistema
+SUAVE_ESPERA_TOTAL_MAXIMA = 60  # Segundos de pausas seguidas tras los que se sigue solo al ritmo del token bucket
+
+# --- CONFIGURACIÓN DE LA ESTIMACIÓN RÁPIDA --- #
+ESTIMACION_MAX_DIRECTORIOS = 40  # Directorios listados por raíz
+ESTIMACION_MAX_ENTRADAS = 30  # Entradas consultadas por directorio
+ESTIMACION_TIEMPO_LIMITE = 0.5  # Segundos máximos por vista previa (todas las raíces)
+
+# --- CONFIGURACIÓN DE DETECCIÓN DE DUPLICADOS --- #
+DUPLICADOS_TAMAÑO_MINIMO = 1024 * 1024  # Ignorar archivos menores de 1 MB
+DUPLICADOS_BLOQUE_PARCIAL = 64 * 1024  # Bytes leídos al inicio y al final del archivo
+DUPLICADOS_BLOQUE_LECTURA = 8 * 1024 * 1024  # Bytes hasheados por paso en la lectura completa
+# Caché de hashes por (ruta, tamaño, mtime), junto al script como los diarios de cuarentena
+DUPLICADOS_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'optimizador_hashes.json')
+
+# --- CONFIGURACIÓN DEL ÁRBOL DE DIRECTORIOS --- #
+# Último árbol de tamaños calculado por analizar_disco, junto al script
+ARBOL_ARCHIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'optimizador_arbol.bin')
+
+# --- CONFIGURACIÓN DE LA CUARENTENA --- #
+CUARENTENA_CARPETA = '$OptimizadorCuarentena'  # Carpeta en la raíz de cada volumen
+# Diarios de cada ejecución (para restaurar), junto al script para que los encuentre
+# cualquier ejecución aunque se lance desde otra carpeta (Programador de tareas, modo por lotes)
+CUARENTENA_DIARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'optimizador_cuarentena')
+CUARENTENA_RETENCION_DIAS = 7  # Días antes de purgar definitivamente
+
+# --- CONFIGURACIÓN DEL PROGRAMADOR RESIDENTE --- #
+PROGRAMADOR_UMBRAL = 90  # % de uso de disco que dispara la limpieza
+PROGRAMADOR_HISTERESIS = 5  # Puntos por debajo del umbral en los que se detiene
+PROGRAMADOR_INTERVALO = 60  # Segundos entre comprobaciones de uso de disco
+PROGRAMADOR_ESPERA_MAXIMA = 6 * 3600  # Espera máxima entre ciclos que no consiguen bajar del umbral
+# De menor a mayor impacto; se detiene al bajar del umbral. Sin vaciar_papelera: es un borrado
+# definitivo que no pasa por la cuarentena y no conviene hacerlo sin que el usuario lo pida
+PROGRAMADOR_ACCIONES = [
+    ("limpieza_temporales", "baja"),
+    ("limpiar_cache_navegadores", "baja"),
+    ("limpieza_temporales", "media"),
+    ("limpiar_cache_navegadores", "media"),
+    ("limpieza_temporales", "alta"),
+]
+
 # --- CONFIGURACIÓN INICIAL --- #
 class Colors:
     GREEN = '\033[92m'
@@ -215,9 +273,371 @@ def auto_optimizar_con_phi3():
         logger.error(f"Error procesando respuesta Phi3-mini: {str(e)} - Respuesta: {respuesta[:500]}")
         print(f"Respuesta completa:\n{respuesta[:500]}...")
 
+# --- MODO SUAVE (BAJA PRIORIDAD) --- #
+class LimitadorTokens:
+    """Token bucket que limita el número de operaciones por segundo (compartible entre hilos)"""
+    def __init__(self, tasa, capacidad):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consumir(self, n=1):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                espera = (n - self.tokens) / self.tasa
+            time.sleep(espera)
+
+class ModoSuave:
+    """Limita el ritmo de la limpieza y se detiene cuando el sistema está cargado"""
+    def __init__(self, ops_por_segundo=SUAVE_OPS_POR_SEGUNDO, umbral_cpu=SUAVE_UMBRAL_CPU,
+                 umbral_disco_mbs=SUAVE_UMBRAL_DISCO_MBS):
+        self.limitador = LimitadorTokens(ops_por_segundo, SUAVE_RAFAGA)
+        self.umbral_cpu = umbral_cpu
+        self.umbral_disco = umbral_disco_mbs * 1024 * 1024
+        self._ultima_medicion = time.monotonic()
+        self._io_previo = self._bytes_disco()
+        self._ignorar_carga_hasta = 0.0
+        self._lock = threading.Lock()
+        psutil.cpu_percent(interval=None)  # Inicializa la medición de CPU
+
+    def _bytes_disco(self):
+        try:
+            io = psutil.disk_io_counters()
+            return io.read_bytes + io.write_bytes if io else 0
+        except Exception:
+            return 0
+
+    def _sistema_cargado(self):
+        with self._lock:
+            ahora = time.monotonic()
+            transcurrido = ahora - self._ultima_medicion
+            if transcurrido <= 0:
+                return False
+            io_actual = self._bytes_disco()
+            disco_por_segundo = (io_actual - self._io_previo) / transcurrido
+            cpu = psutil.cpu_percent(interval=None)
+            self._ultima_medicion = ahora
+            self._io_previo = io_actual
+        return cpu > self.umbral_cpu or disco_por_segundo > self.umbral_disco
+
+    def esperar(self):
+        """Espera el turno de la siguiente operación sobre el disco"""
+        self.limitador.consumir()
+        ahora = time.monotonic()
+        if ahora < self._ignorar_carga_hasta or ahora - self._ultima_medicion < SUAVE_INTERVALO_MEDICION:
+            return
+        espera = SUAVE_INTERVALO_MEDICION
+        esperado = 0.0
+        while self._sistema_cargado():
+            if esperado >= SUAVE_ESPERA_TOTAL_MAXIMA:
+                # Carga sostenida: seguir al ritmo del token bucket durante otro periodo igual
+                logger.info(f"Modo suave: carga sostenida durante {esperado:.0f}s, se continúa a ritmo limitado")
+                self._ignorar_carga_hasta = time.monotonic() + SUAVE_ESPERA_TOTAL_MAXIMA
+                return
+            logger.info(f"Modo suave: sistema cargado, esperando {espera:.1f}s")
+            time.sleep(espera)
+            esperado += espera
+            espera = min(espera * 2, SUAVE_ESPERA_MAXIMA)
+
+modo_suave = None
+_prioridad_original = None
+
+def activar_modo_suave(ops_por_segundo=SUAVE_OPS_POR_SEGUNDO, umbral_cpu=SUAVE_UMBRAL_CPU,
+                       umbral_disco_mbs=SUAVE_UMBRAL_DISCO_MBS):
+    """Reduce la prioridad de CPU y E/S del proceso y limita el ritmo de la limpieza"""
+    global modo_suave, _prioridad_original
+    proceso = psutil.Process()
+    try:
+        if _prioridad_original is None:
+            _prioridad_original = (proceso.nice(), proceso.ionice())
+        if hasattr(psutil, 'BELOW_NORMAL_PRIORITY_CLASS'):
+            proceso.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+        else:
+            proceso.nice(10)
+        if hasattr(psutil, 'IOPRIO_VERYLOW'):
+            proceso.ionice(psutil.IOPRIO_VERYLOW)
+        elif hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+            proceso.ionice(psutil.IOPRIO_CLASS_IDLE)
+    except Exception as e:
+        logger.warning(f"No se pudo reducir la prioridad del proceso: {str(e)}")
+    modo_suave = ModoSuave(ops_por_segundo, umbral_cpu, umbral_disco_mbs)
+    logger.info(f"Modo suave activado ({ops_por_segundo} ops/s, CPU>{umbral_cpu}%, disco>{umbral_disco_mbs} MB/s)")
+
+def desactivar_modo_suave():
+    """Restaura la prioridad original del proceso"""
+    global modo_suave, _prioridad_original
+    if _prioridad_original is not None:
+        proceso = psutil.Process()
+        nice, ionice = _prioridad_original
+        try:
+            proceso.nice(nice)
+            if isinstance(ionice, int):
+                proceso.ionice(ionice)
+            else:
+                proceso.ionice(ionice.ioclass, ionice.value)
+        except Exception as e:
+            logger.warning(f"No se pudo restaurar la prioridad del proceso: {str(e)}")
+        _prioridad_original = None
+    modo_suave = None
+    logger.info("Modo suave desactivado")
+
+def pausa_suave():
+    """Punto de control antes de cada borrado o consulta de archivos"""
+    suave = modo_suave  # Copia local: otro hilo puede desactivar el modo entre la comprobación y el uso
+    if suave is not None:
+        suave.esperar()
+
+def borrar_carpeta(ruta, ignorar_errores=False):
+    """Borra una carpeta; en modo suave archivo a archivo para respetar el límite de ritmo"""
+    if modo_suave is not None:
+        # recorrer_archivos pasa por pausa_suave() en cada entrada y no entra en enlaces
+        for archivo, _, _ in recorrer_archivos(ruta, deduplicar=False):
+            try:
+                os.remove(archivo)
+            except OSError as e:
+                logger.warning(f"No se pudo eliminar {archivo}: {str(e)}")
+    # Solo quedan carpetas vacías y enlaces (o todo, fuera del modo suave)
+    shutil.rmtree(ruta, ignore_errors=ignorar_errores)
+
+# --- CUARENTENA (BORRADO REVERSIBLE) --- #
+class Cuarentena:
+    """Mueve lo que se limpia a una carpeta de cuarentena del mismo volumen y lo anota en un diario.
+    
+    Cada llamada de limpieza abre su propia ejecución (un diario), con la antigüedad que usa la
+    purga. Las ejecuciones de una misma opción del menú o lote comparten sesión, que es lo que
+    deshace restaurar_cuarentena.
+    """
+    FORMATO_ID = '%Y%m%d_%H%M%S_%f'
+    
+    def __init__(self):
+        self.id = datetime.now().strftime(self.FORMATO_ID)
+        self.sesion = sesion_cuarentena or self.id
+        self.diario = os.path.join(CUARENTENA_DIARIOS, f"{self.id}.jsonl")
+        self.contador = 0
+        self.bytes_movidos = 0  # Siguen ocupando el volumen hasta la purga
+    
+    def _anotar(self, entrada):
+        os.makedirs(CUARENTENA_DIARIOS, exist_ok=True)
+        with open(self.diario, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entrada) + "\n")
+    
+    def mover(self, ruta, tamaño=0):
+        """Renombra ruta dentro de la cuarentena; False si no es posible (p. ej. otro volumen)"""
+        unidad = os.path.splitdrive(os.path.abspath(ruta))[0] + os.sep
+        carpeta = os.path.join(unidad, CUARENTENA_CARPETA, self.id)
+        self.contador += 1
+        destino = os.path.join(carpeta, f"{self.contador}_{os.path.basename(ruta)}")
+        try:
+            os.makedirs(carpeta, exist_ok=True)
+            os.rename(ruta, destino)
+        except OSError as e:
+            logger.warning(f"No se pudo mover a cuarentena {ruta}: {str(e)}")
+            return False
+        self._anotar({"tipo": "archivo", "sesion": self.sesion, "origen": ruta, "destino": destino, "bytes": tamaño})
+        self.bytes_movidos += tamaño
+        return True
+    
+    def anotar_valor_registro(self, subclave, nombre, valor, tipo):
+        if isinstance(valor, bytes):
+            valor = {"hex": valor.hex()}
+        self._anotar({"tipo": "registro", "sesion": self.sesion, "clave": "HKEY_CURRENT_USER", "subclave": subclave,
+                      "nombre": nombre, "valor": valor, "tipo_valor": tipo})
+
+cuarentena_activa = False
+cuarentena = None  # Ejecución en curso (una por llamada de limpieza)
+sesion_cuarentena = None  # Agrupa las ejecuciones de una opción del menú o de un lote
+
+def activar_cuarentena():
+    """Las limpiezas siguientes mueven a cuarentena en lugar de borrar"""
+    global cuarentena_activa
+    cuarentena_activa = True
+    logger.info("Cuarentena activada")
+
+def desactivar_cuarentena():
+    global cuarentena_activa, cuarentena
+    cuarentena_activa = False
+    cuarentena = None
+    logger.info("Cuarentena desactivada")
+
+def iniciar_sesion_cuarentena():
+    """Agrupa las limpiezas siguientes en una sesión que se restaura de una vez"""
+    global sesion_cuarentena
+    sesion_cuarentena = datetime.now().strftime(Cuarentena.FORMATO_ID)
+
+def iniciar_ejecucion_cuarentena():
+    """Abre una ejecución de cuarentena nueva para la limpieza que empieza, si está activada"""
+    global cuarentena
+    cuarentena = Cuarentena() if cuarentena_activa else None
+
+def eliminar_ruta(ruta, tamaño=0):
+    """Borra un archivo o carpeta, o lo mueve a cuarentena si está activa.
+    
+    Devuelve True si se movió a cuarentena (el espacio aún no se ha liberado).
+    """
+    if cuarentena is not None and cuarentena.mover(ruta, tamaño):
+        return True
+    if os.path.isdir(ruta):
+        borrar_carpeta(ruta)
+    else:
+        os.remove(ruta)
+    return False
+
+def bytes_en_cuarentena():
+    """Bytes movidos a cuarentena por la última limpieza"""
+    return cuarentena.bytes_movidos if cuarentena is not None else 0
+
+def mostrar_resumen_cuarentena():
+    if bytes_en_cuarentena():
+        print(f"{Colors.CYAN}Movidos a cuarentena: {bytes_a_mb(bytes_en_cuarentena())} MB "
+              f"(se liberarán tras {CUARENTENA_RETENCION_DIAS} días){Colors.END}")
+        logger.info(f"Movidos a cuarentena: {bytes_a_mb(bytes_en_cuarentena())} MB (ejecución {cuarentena.id})")
+
+def _leer_diario(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+def _borrar_destino(destino):
+    if os.path.isdir(destino):
+        borrar_carpeta(destino, ignorar_errores=True)
+    elif os.path.exists(destino):
+        os.remove(destino)
+
+def _carpetas_ejecucion(entradas):
+    return {os.path.dirname(e["destino"]) for e in entradas if e["tipo"] == "archivo"}
+
+def purgar_cuarentena(retencion_dias=CUARENTENA_RETENCION_DIAS):
+    """Borra definitivamente las ejecuciones en cuarentena más antiguas que la retención"""
+    if not os.path.isdir(CUARENTENA_DIARIOS):
+        return 0
+    limite = datetime.now() - timedelta(days=retencion_dias)
+    purgadas = 0
+    for nombre in sorted(os.listdir(CUARENTENA_DIARIOS)):
+        diario = os.path.join(CUARENTENA_DIARIOS, nombre)
+        try:
+            if datetime.strptime(nombre.split('.')[0], Cuarentena.FORMATO_ID) > limite:
+                continue
+            entradas = _leer_diario(diario)
+            for entrada in entradas:
+                if entrada["tipo"] == "archivo":
+                    pausa_suave()
+                    _borrar_destino(entrada["destino"])
+            for carpeta in _carpetas_ejecucion(entradas):
+                shutil.rmtree(carpeta, ignore_errors=True)
+            os.remove(diario)
+            purgadas += 1
+            logger.info(f"Cuarentena {nombre} purgada")
+        except (OSError, ValueError) as e:
+            logger.error(f"Error al purgar cuarentena {nombre}: {str(e)}")
+    return purgadas
+
+def purgar_cuarentena_baja_prioridad(retencion_dias=CUARENTENA_RETENCION_DIAS):
+    """Purga en el hilo actual con prioridad de fondo (CPU y E/S) y la restablece al terminar"""
+    THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+    THREAD_MODE_BACKGROUND_END = 0x00020000
+    try:
+        ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(),
+                                                 THREAD_MODE_BACKGROUND_BEGIN)
+    except Exception:
+        pass
+    try:
+        return purgar_cuarentena(retencion_dias)
+    finally:
+        try:
+            ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(),
+                                                     THREAD_MODE_BACKGROUND_END)
+        except Exception:
+            pass
+
+_hilo_purga = None
+
+def iniciar_purga_en_segundo_plano(retencion_dias=CUARENTENA_RETENCION_DIAS):
+    """Lanza la purga de cuarentenas caducadas en un hilo de baja prioridad (solo uno a la vez)"""
+    global _hilo_purga
+    if _hilo_purga is None or not _hilo_purga.is_alive():
+        _hilo_purga = threading.Thread(target=purgar_cuarentena_baja_prioridad, args=(retencion_dias,),
+                                       name="purga-cuarentena", daemon=True)
+        _hilo_purga.start()
+    return _hilo_purga
+
+def listar_cuarentenas():
+    """Sesiones en cuarentena de la más reciente a la más antigua: [(sesion, diarios, elementos, bytes)]"""
+    if not os.path.isdir(CUARENTENA_DIARIOS):
+        return []
+    sesiones = {}
+    for nombre in sorted(os.listdir(CUARENTENA_DIARIOS)):
+        try:
+            entradas = _leer_diario(os.path.join(CUARENTENA_DIARIOS, nombre))
+        except (OSError, ValueError) as e:
+            logger.error(f"Error al leer el diario {nombre}: {str(e)}")
+            continue
+        # Los diarios sin sesión forman una sesión propia
+        sesion = entradas[0].get("sesion") if entradas else None
+        sesion = sesion or nombre.split('.')[0]
+        datos = sesiones.setdefault(sesion, [[], 0, 0])
+        datos[0].append(nombre)
+        datos[1] += len(entradas)
+        datos[2] += sum(e.get("bytes", 0) for e in entradas)
+    return [(sesion, *datos) for sesion, datos in sorted(sesiones.items(), reverse=True)]
+
+def restaurar_cuarentena(id_sesion=None):
+    """Deshace una sesión en cuarentena (la más reciente por defecto) reproduciendo sus diarios.
+    
+    id_sesion también admite el id de un diario concreto o un prefijo.
+    """
+    sesiones = listar_cuarentenas()
+    if id_sesion is not None:
+        sesiones = [datos for datos in sesiones
+                    if datos[0].startswith(id_sesion) or any(d.startswith(id_sesion) for d in datos[1])]
+    if not sesiones:
+        return "No hay cuarentenas para restaurar"
+    sesion, diarios = sesiones[0][0], sesiones[0][1]
+    if id_sesion is not None and not sesion.startswith(id_sesion):
+        diarios = [d for d in diarios if d.startswith(id_sesion)]
+    
+    restaurados = errores = 0
+    for nombre in reversed(diarios):
+        diario = os.path.join(CUARENTENA_DIARIOS, nombre)
+        entradas = _leer_diario(diario)
+        errores_diario = 0
+        for entrada in reversed(entradas):
+            try:
+                if entrada["tipo"] == "archivo":
+                    os.makedirs(os.path.dirname(entrada["origen"]), exist_ok=True)
+                    os.rename(entrada["destino"], entrada["origen"])
+                else:
+                    valor = entrada["valor"]
+                    if isinstance(valor, dict):
+                        valor = bytes.fromhex(valor["hex"])
+                    clave = winreg.CreateKey(getattr(winreg, entrada["clave"]), entrada["subclave"])
+                    winreg.SetValueEx(clave, entrada["nombre"], 0, entrada["tipo_valor"], valor)
+                    winreg.CloseKey(clave)
+                restaurados += 1
+            except OSError as e:
+                errores_diario += 1
+                logger.error(f"Error al restaurar {entrada.get('origen', entrada.get('nombre'))}: {str(e)}")
+        
+        for carpeta in _carpetas_ejecucion(entradas):
+            try:
+                os.rmdir(carpeta)
+            except OSError:
+                pass
+        if not errores_diario:
+            os.remove(diario)
+        errores += errores_diario
+    logger.info(f"Cuarentena {sesion} restaurada ({len(diarios)} diarios): {restaurados} elementos, {errores} errores")
+    return f"Restaurados: {restaurados}, Errores: {errores}"
+
 # --- FUNCIONES DE LIMPIEZA MEJORADAS --- #
-def limpiar_archivos_temporales(intensidad="media"):
-    """Elimina archivos temporales con diferentes niveles de intensidad"""
+def obtener_directorios_temporales(intensidad="media"):
+    """Devuelve los directorios temporales a limpiar según la intensidad"""
     directorios = [
         os.environ.get('TEMP'),
         os.environ.get('TMP'),
@@ -232,9 +652,17 @@ def limpiar_archivos_temporales(intensidad="media"):
             os.path.join(os.environ['USERPROFILE'], 'AppData', 'Local', 'Microsoft', 'Windows', 'INetCache'),
             os.path.join(os.environ['USERPROFILE'], 'AppData', 'Local', 'Microsoft', 'Edge', 'User Data', 'Default', 'Cache'),
         ])
-    
+    return directorios
+
+def dias_limite_temporales(intensidad="media"):
+    return 7 if intensidad == "baja" else 3 if intensidad == "media" else 1
+
+def limpiar_archivos_temporales(intensidad="media"):
+    """Elimina archivos temporales con diferentes niveles de intensidad"""
+    directorios = obtener_directorios_temporales(intensidad)
     espacio_liberado = 0
-    dias_limite = 7 if intensidad == "baja" else 3 if intensidad == "media" else 1
+    dias_limite = dias_limite_temporales(intensidad)
+    iniciar_ejecucion_cuarentena()
     archivos_eliminados = []
     logger.info(f"Iniciando limpieza de temporales (intensidad={intensidad})")
     
@@ -245,6 +673,12 @@ def limpiar_archivos_temporales(intensidad="media"):
                 for item in os.listdir(directorio):
                     ruta_completa = os.path.join(directorio, item)
                     try:
+                        pausa_suave()
+                        # No seguir symlinks ni junctions hacia fuera del directorio temporal
+                        if es_enlace(os.lstat(ruta_completa)):
+                            logger.info(f"Enlace omitido: {ruta_completa}")
+                            continue
+                        
                         # Calcular antigüedad del archivo
                         tiempo_mod = datetime.fromtimestamp(os.path.getmtime(ruta_completa))
                         antiguedad = datetime.now() - tiempo_mod
@@ -254,13 +688,13 @@ def limpiar_archivos_temporales(intensidad="media"):
                             
                         if os.path.isfile(ruta_completa):
                             tamaño = os.path.getsize(ruta_completa)
-                            os.remove(ruta_completa)
-                            espacio_liberado += tamaño
+                            if not eliminar_ruta(ruta_completa, tamaño):
+                                espacio_liberado += tamaño
                             archivos_eliminados.append(ruta_completa)
                         elif os.path.isdir(ruta_completa):
                             tamaño = obtener_tamaño_carpeta(ruta_completa)
-                            shutil.rmtree(ruta_completa)
-                            espacio_liberado += tamaño
+                            if not eliminar_ruta(ruta_completa, tamaño):
+                                espacio_liberado += tamaño
                             archivos_eliminados.append(ruta_completa + " (carpeta)")
                     except PermissionError as pe:
                         logger.warning(f"Permiso denegado: {ruta_completa} - {str(pe)}")
@@ -279,6 +713,7 @@ def limpiar_archivos_temporales(intensidad="media"):
         if len(archivos_eliminados) > 5:
             print(f"... y {len(archivos_eliminados) - 5} más")
         logger.info(f"Se eliminaron {len(archivos_eliminados)} archivos. Espacio liberado: {bytes_a_mb(espacio_liberado)} MB")
+        mostrar_resumen_cuarentena()
     else:
         logger.info("No se encontraron archivos para eliminar")
                 
@@ -300,57 +735,47 @@ def vaciar_papelera():
         logger.error(f"Error al vaciar papelera: {str(e)}")
         return False
 
+def obtener_caches_navegadores():
+    """Devuelve pares (navegador, directorio de caché) existentes"""
+    caches = []
+    edge = os.path.join(os.environ['LOCALAPPDATA'], 'Microsoft', 'Edge', 'User Data', 'Default', 'Cache')
+    if os.path.exists(edge):
+        caches.append(('Edge', edge))
+    
+    # Para Firefox, recorremos los perfiles
+    perfiles = os.path.join(os.environ['APPDATA'], 'Mozilla', 'Firefox', 'Profiles')
+    if os.path.exists(perfiles):
+        for perfil in os.listdir(perfiles):
+            if perfil.endswith('.default-release'):
+                cache_dir = os.path.join(perfiles, perfil, 'cache2')
+                if os.path.exists(cache_dir):
+                    caches.append(('Firefox', cache_dir))
+    return caches
+
+def dias_limite_navegadores(intensidad="media"):
+    return 30 if intensidad == "baja" else 14 if intensidad == "media" else 1
+
 def limpiar_cache_navegadores(intensidad="media"):
     """Limpia caché de navegadores con intensidad variable"""
-    navegadores = {
-        'Edge': os.path.join(os.environ['LOCALAPPDATA'], 'Microsoft', 'Edge', 'User Data', 'Default', 'Cache'),
-        'Firefox': os.path.join(os.environ['APPDATA'], 'Mozilla', 'Firefox', 'Profiles')
-    }
-    
     espacio_liberado = 0
-    dias_limite = 30 if intensidad == "baja" else 14 if intensidad == "media" else 1
+    dias_limite = dias_limite_navegadores(intensidad)
+    iniciar_ejecucion_cuarentena()
     archivos_eliminados = []
     logger.info(f"Iniciando limpieza de cache de navegadores (intensidad={intensidad})")
     
-    for nombre, ruta_base in navegadores.items():
-        if not os.path.exists(ruta_base):
-            continue
-            
+    for nombre, cache_dir in obtener_caches_navegadores():
         print(f"\n{Colors.BLUE}Limpiando caché de {nombre} ({intensidad}){Colors.END}")
-            
-        if nombre == 'Firefox':
-            # Para Firefox, recorremos los perfiles
-            for perfil in os.listdir(ruta_base):
-                if perfil.endswith('.default-release'):
-                    cache_dir = os.path.join(ruta_base, perfil, 'cache2')
-                    if os.path.exists(cache_dir):
-                        # Eliminar solo archivos antiguos
-                        for root, dirs, files in os.walk(cache_dir):
-                            for file in files:
-                                file_path = os.path.join(root, file)
-                                try:
-                                    tiempo_mod = datetime.fromtimestamp(os.path.getmtime(file_path))
-                                    if datetime.now() - tiempo_mod > timedelta(days=dias_limite):
-                                        file_size = os.path.getsize(file_path)
-                                        os.remove(file_path)
-                                        espacio_liberado += file_size
-                                        archivos_eliminados.append(file_path)
-                                except Exception as e:
-                                    logger.error(f"Error eliminando {file_path}: {str(e)}")
-        else:
-            # Para Edge
-            for root, dirs, files in os.walk(ruta_base):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        tiempo_mod = datetime.fromtimestamp(os.path.getmtime(file_path))
-                        if datetime.now() - tiempo_mod > timedelta(days=dias_limite):
-                            file_size = os.path.getsize(file_path)
-                            os.remove(file_path)
-                            espacio_liberado += file_size
-                            archivos_eliminados.append(file_path)
-                    except Exception as e:
-                        logger.error(f"Error eliminando {file_path}: {str(e)}")
+        
+        # Eliminar solo archivos antiguos (hay que borrar todos los enlaces duros, no se deduplica)
+        for file_path, st, _ in recorrer_archivos(cache_dir, deduplicar=False):
+            try:
+                tiempo_mod = datetime.fromtimestamp(st.st_mtime)
+                if datetime.now() - tiempo_mod > timedelta(days=dias_limite):
+                    if not eliminar_ruta(file_path, st.st_size):
+                        espacio_liberado += st.st_size
+                    archivos_eliminados.append(file_path)
+            except Exception as e:
+                logger.error(f"Error eliminando {file_path}: {str(e)}")
     
     # Mostrar resumen detallado
     if archivos_eliminados:
@@ -360,11 +785,464 @@ def limpiar_cache_navegadores(intensidad="media"):
         if len(archivos_eliminados) > 5:
             print(f"... y {len(archivos_eliminados) - 5} más")
         logger.info(f"Se eliminaron {len(archivos_eliminados)} archivos de cache. Espacio liberado: {bytes_a_mb(espacio_liberado)} MB")
+        mostrar_resumen_cuarentena()
     else:
         logger.info("No se encontraron archivos de cache para eliminar")
                         
     return espacio_liberado
 
+# --- ESTIMACIÓN RÁPIDA DE ESPACIO RECUPERABLE --- #
+def _estimar_total(valores, n):
+    """Extrapola una muestra de valores a una población de n elementos (total, varianza, suficiente).
+    
+    Con menos de dos valores medidos no se puede estimar la dispersión: se devuelve una varianza
+    igual al cuadrado del total (margen de ~200%) y suficiente=False.
+    """
+    k = len(valores)
+    if n == 0:
+        return 0.0, 0.0, True
+    if k == 0:
+        return 0.0, 0.0, False
+    media = sum(valores) / k
+    if k >= n:
+        return n * media, 0.0, True
+    if k < 2:
+        return n * media, (n * media) ** 2, False
+    varianza = sum((v - media) ** 2 for v in valores) / (k - 1)
+    return n * media, n * n * varianza / k * (1 - k / n), True
+
+def _listar_directorio(directorio, fin, listados=None):
+    """Devuelve (subdirectorios, archivos, completo) como DirEntry, sin symlinks ni junctions.
+    
+    Comprueba el tiempo límite mientras lee, así un directorio con cientos de miles de entradas
+    no bloquea la estimación (completo=False si se cortó). Con listados se reutiliza la lectura
+    entre estimaciones de la misma vista previa.
+    """
+    if listados is not None and directorio in listados:
+        return listados[directorio]
+    subdirectorios = []
+    archivos = []
+    completo = True
+    try:
+        with os.scandir(directorio) as entradas:
+            for i, entrada in enumerate(entradas):
+                if i % 256 == 0 and time.monotonic() >= fin:
+                    completo = False
+                    break
+                try:
+                    if entrada.is_dir(follow_symlinks=False):
+                        if not es_enlace(entrada.stat(follow_symlinks=False)):
+                            subdirectorios.append(entrada)
+                    elif entrada.is_file(follow_symlinks=False):
+                        archivos.append(entrada)
+                except OSError:
+                    continue
+    except OSError:
+        completo = False
+    resultado = (subdirectorios, archivos, completo)
+    if listados is not None and completo:
+        listados[directorio] = resultado
+    return resultado
+
+def _medir_archivos(archivos, corte, max_entradas):
+    """Estima (bytes, archivos) anteriores a corte en un directorio a partir de una muestra (None = todos)"""
+    if max_entradas is None or max_entradas >= len(archivos):
+        muestra = archivos
+    else:
+        muestra = random.sample(archivos, max_entradas)
+    tamaños = []
+    cuentas = []
+    for entrada in muestra:
+        try:
+            st = entrada.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        antiguo = corte is None or st.st_mtime < corte
+        tamaños.append(st.st_size if antiguo else 0)
+        cuentas.append(1 if antiguo else 0)
+    bytes_dir, _, _ = _estimar_total(tamaños, len(archivos))
+    archivos_dir, _, _ = _estimar_total(cuentas, len(archivos))
+    return bytes_dir, archivos_dir
+
+def _muestrear_arbol(ruta, corte, max_directorios, max_entradas, fin, listados=None):
+    """Estima bytes y archivos bajo ruta con mtime anterior a corte (None = todos).
+    
+    Recorre el árbol por niveles leyendo una muestra aleatoria de las carpetas de cada nivel: el
+    número medio de subcarpetas de las leídas estima cuántas carpetas hay en el nivel siguiente,
+    así los subárboles no visitados también cuentan. Los niveles leídos enteros son exactos. Si se
+    agota el presupuesto o el tiempo antes de la última profundidad, el resultado es una cota
+    inferior (completo=False). Devuelve (bytes, archivos, varianza, completo), o None si no dio
+    tiempo a leer ni la carpeta raíz.
+    """
+    if listados is None:
+        listados = {}
+    nivel = [ruta]
+    poblacion, var_poblacion = 1.0, 0.0  # Carpetas estimadas en el nivel actual
+    restantes = max_directorios
+    total_bytes = total_archivos = varianza = 0.0
+    completo = True
+    
+    while nivel:
+        if restantes <= 0 or time.monotonic() >= fin:
+            completo = False
+            break
+        # Se reserva presupuesto para los niveles más profundos
+        k = min(len(nivel), max(2, restantes // 4), restantes)
+        bytes_dirs, archivos_dirs, hijos_dirs = [], [], []
+        siguiente = []
+        for directorio in random.sample(nivel, k):
+            subdirectorios, archivos, listado_completo = _listar_directorio(directorio, fin, listados)
+            if not listado_completo:
+                completo = False
+                break
+            b, a = _medir_archivos(archivos, corte, max_entradas)
+            bytes_dirs.append(b)
+            archivos_dirs.append(a)
+            hijos_dirs.append(len(subdirectorios))
+            siguiente.extend(d.path for d in subdirectorios)
+        restantes -= len(bytes_dirs)
+        if not bytes_dirs:
+            break
+        
+        # Totales sobre las carpetas conocidas del nivel, escalados a la población estimada
+        escala = poblacion / len(nivel)
+        b, v, suficiente = _estimar_total(bytes_dirs, len(nivel))
+        a, _, _ = _estimar_total(archivos_dirs, len(nivel))
+        h, v_h, _ = _estimar_total(hijos_dirs, len(nivel))
+        if var_poblacion and len(bytes_dirs) < len(nivel):
+            # Las carpetas conocidas ya son una muestra: sin corrección por población finita
+            fpc = 1 - len(bytes_dirs) / len(nivel)
+            v, v_h = v / fpc, v_h / fpc
+        total_bytes += escala * b
+        total_archivos += escala * a
+        varianza += escala ** 2 * v + (b / len(nivel)) ** 2 * var_poblacion
+        completo = completo and suficiente
+        var_poblacion = escala ** 2 * v_h + (h / len(nivel)) ** 2 * var_poblacion
+        poblacion = escala * h
+        nivel = siguiente
+    
+    if restantes == max_directorios:
+        return None
+    return total_bytes, total_archivos, varianza, completo
+
+def _raices_existentes(directorios):
+    raices = []
+    vistos = set()
+    for directorio in directorios:
+        if not directorio or not os.path.exists(directorio):
+            continue
+        clave = os.path.normcase(os.path.abspath(directorio))
+        if clave not in vistos:
+            vistos.add(clave)
+            raices.append(directorio)
+    return raices
+
+def _fin_para_raiz(fin_total, restantes):
+    """Reparte el tiempo que queda a partes iguales entre las raíces pendientes"""
+    ahora = time.monotonic()
+    return ahora + max(0.0, fin_total - ahora) / restantes
+
+def _resultado_estimacion(total_bytes, total_archivos, varianza, completo):
+    return int(total_bytes), int(total_archivos), int(1.96 * math.sqrt(varianza)), completo
+
+def estimar_limpieza_temporales(intensidad="media", tiempo_limite=ESTIMACION_TIEMPO_LIMITE, listados=None):
+    """Estima por muestreo lo que liberaría limpiar_archivos_temporales sin borrar nada.
+    
+    Devuelve (bytes, archivos, margen, completo): margen es el semiancho del intervalo de confianza
+    del 95% y completo=False indica que faltaron muestras (tiempo agotado o muestra insuficiente).
+    tiempo_limite es el total para todas las raíces; listados permite reutilizar las lecturas de
+    directorios entre varias estimaciones.
+    """
+    if listados is None:
+        listados = {}
+    corte = time.time() - dias_limite_temporales(intensidad) * 86400
+    fin_total = time.monotonic() + tiempo_limite
+    total_bytes = total_archivos = varianza = 0.0
+    completo = True
+    raices = _raices_existentes(obtener_directorios_temporales(intensidad))
+    
+    for i, directorio in enumerate(raices):
+        fin = _fin_para_raiz(fin_total, len(raices) - i)
+        subdirectorios, archivos, listado_completo = _listar_directorio(directorio, fin, listados)
+        entradas = subdirectorios + archivos
+        completo = completo and listado_completo
+        
+        # La limpieza decide por la antigüedad del elemento de primer nivel
+        muestra = random.sample(entradas, min(ESTIMACION_MAX_ENTRADAS, len(entradas)))
+        presupuesto = max(8, ESTIMACION_MAX_DIRECTORIOS // max(1, len(muestra)))
+        tamaños = []
+        cuentas = []
+        varianzas = []
+        for entrada in muestra:
+            if time.monotonic() >= fin:
+                break
+            try:
+                st = entrada.stat(follow_symlinks=False)
+                if st.st_mtime >= corte:
+                    tamaños.append(0)
+                    cuentas.append(0)
+                elif entrada.is_dir(follow_symlinks=False):
+                    subarbol = _muestrear_arbol(entrada.path, None, presupuesto, ESTIMACION_MAX_ENTRADAS, fin, listados)
+                    if subarbol is None:
+                        continue  # Sin medir: no cuenta como vacío
+                    b, a, v, sub_completo = subarbol
+                    tamaños.append(b)
+                    cuentas.append(a)
+                    varianzas.append(v)
+                    completo = completo and sub_completo
+                else:
+                    tamaños.append(st.st_size)
+                    cuentas.append(1)
+            except OSError:
+                continue
+        
+        # Los elementos no medidos se extrapolan a partir de los medidos
+        b, v, suficiente = _estimar_total(tamaños, len(entradas))
+        a, _, _ = _estimar_total(cuentas, len(entradas))
+        if tamaños:
+            v += sum(varianzas) * (len(entradas) / len(tamaños)) ** 2
+        total_bytes += b
+        total_archivos += a
+        varianza += v
+        completo = completo and suficiente and len(tamaños) == len(muestra)
+    
+    return _resultado_estimacion(total_bytes, total_archivos, varianza, completo)
+
+def estimar_cache_navegadores(intensidad="media", tiempo_limite=ESTIMACION_TIEMPO_LIMITE, listados=None):
+    """Estima por muestreo lo que liberaría limpiar_cache_navegadores (bytes, archivos, margen, completo)"""
+    if listados is None:
+        listados = {}
+    corte = time.time() - dias_limite_navegadores(intensidad) * 86400
+    fin_total = time.monotonic() + tiempo_limite
+    total_bytes = total_archivos = varianza = 0.0
+    completo = True
+    caches = obtener_caches_navegadores()
+    for i, (_, cache_dir) in enumerate(caches):
+        subarbol = _muestrear_arbol(cache_dir, corte, ESTIMACION_MAX_DIRECTORIOS, ESTIMACION_MAX_ENTRADAS,
+                                    _fin_para_raiz(fin_total, len(caches) - i), listados)
+        if subarbol is None:
+            completo = False
+            continue
+        b, a, v, sub_completo = subarbol
+        total_bytes += b
+        total_archivos += a
+        varianza += v
+        completo = completo and sub_completo
+    return _resultado_estimacion(total_bytes, total_archivos, varianza, completo)
+
+def _texto_estimacion(estimacion):
+    bytes_est, archivos, margen, completo = estimacion
+    texto = f"~{bytes_a_mb(bytes_est)} MB (±{bytes_a_mb(margen)}, ~{archivos} archivos)"
+    return texto if completo else texto + " [parcial]"
+
+def mostrar_estimacion_recuperable():
+    """Muestra al instante el espacio recuperable estimado para cada intensidad"""
+    print(f"\n{Colors.CYAN}Espacio recuperable estimado (muestreo, IC 95%):{Colors.END}")
+    intensidades = ("baja", "media", "alta")
+    presupuesto = ESTIMACION_TIEMPO_LIMITE / (2 * len(intensidades))
+    listados = {}  # Cada carpeta se lee una sola vez para todas las intensidades
+    for intensidad in intensidades:
+        temporales = estimar_limpieza_temporales(intensidad, presupuesto, listados)
+        caches = estimar_cache_navegadores(intensidad, presupuesto, listados)
+        print(f"- {intensidad}: temporales {_texto_estimacion(temporales)}, cachés {_texto_estimacion(caches)}")
+
+# --- ÁRBOL DE TAMAÑOS POR DIRECTORIO --- #
+class ArbolDirectorios:
+    """Árbol de tamaños por carpeta guardado en arrays paralelos en lugar de un dict por nodo.
+    
+    Cada nodo i tiene padre (-1 en las raíces), desplazamiento de su nombre en la tabla de
+    nombres, tamaño y número de archivos. Los padres siempre tienen índice menor que sus hijos,
+    lo que permite acumular los tamaños de abajo arriba en una sola pasada inversa.
+    
+    Durante la construcción solo se guarda la pila de carpetas de la ruta actual, por lo que
+    los archivos deben llegar en orden de recorrido en profundidad, como los da recorrer_archivos.
+    """
+    MAGICO = b'ARBOL2\n'
+    TIPOS_CON_SIGNO = 'hilq'
+    TIPOS_SIN_SIGNO = 'HILQ'
+    
+    def __init__(self):
+        self.padres = array.array('i')
+        self.offsets = array.array('I')
+        self.tamaños = array.array('Q')
+        self.archivos = array.array('I')
+        self.nombres = bytearray()
+        self.extensiones = {}  # extensión -> [bytes, archivos]
+        self.acumulado = False
+        self._pila = []  # [(ruta, índice)] de la carpeta actual y sus ancestros, solo al construir
+    
+    def __len__(self):
+        return len(self.padres)
+    
+    def _nuevo_nodo(self, nombre, padre):
+        self.padres.append(padre)
+        self.offsets.append(len(self.nombres))
+        self.nombres.extend(nombre.encode('utf-8', 'surrogatepass'))
+        self.tamaños.append(0)
+        self.archivos.append(0)
+        return len(self.padres) - 1
+    
+    def _indice_directorio(self, ruta):
+        pila = self._pila
+        # Salir de las carpetas ya terminadas hasta el ancestro más cercano
+        while pila and not (ruta == pila[-1][0] or ruta.startswith(pila[-1][0].rstrip(os.sep) + os.sep)):
+            pila.pop()
+        if not pila:
+            pila.append((ruta, self._nuevo_nodo(ruta, -1)))
+            return pila[-1][1]
+        base, indice = pila[-1]
+        for nombre in ruta[len(base):].strip(os.sep).split(os.sep) if ruta != base else []:
+            base = os.path.join(base, nombre)
+            indice = self._nuevo_nodo(nombre, indice)
+            pila.append((base, indice))
+        return indice
+    
+    def agregar_raiz(self, ruta):
+        """Registra una carpeta como raíz (su nombre es la ruta completa)"""
+        self._pila = [(ruta, self._nuevo_nodo(ruta, -1))]
+    
+    def agregar_archivo(self, ruta, tamaño):
+        indice = self._indice_directorio(os.path.dirname(ruta))
+        self.tamaños[indice] += tamaño
+        self.archivos[indice] += 1
+        extension = os.path.splitext(ruta)[1].lower() or '(sin extensión)'
+        total = self.extensiones.setdefault(extension, [0, 0])
+        total[0] += tamaño
+        total[1] += 1
+    
+    def acumular(self):
+        """Suma el contenido de cada carpeta en todas sus carpetas padre"""
+        if not self.acumulado:
+            padres, tamaños, archivos = self.padres, self.tamaños, self.archivos
+            for i in range(len(padres) - 1, -1, -1):
+                padre = padres[i]
+                if padre >= 0:
+                    tamaños[padre] += tamaños[i]
+                    archivos[padre] += archivos[i]
+            self.acumulado = True
+        self._pila = []
+    
+    def nombre(self, indice):
+        fin = self.offsets[indice + 1] if indice + 1 < len(self.offsets) else len(self.nombres)
+        return self.nombres[self.offsets[indice]:fin].decode('utf-8', 'surrogatepass')
+    
+    def ruta(self, indice):
+        partes = []
+        while indice >= 0:
+            partes.append(self.nombre(indice))
+            indice = self.padres[indice]
+        return os.path.join(*reversed(partes))
+    
+    def buscar(self, ruta):
+        """Índice de la carpeta ruta en el árbol, o None si no está"""
+        clave = os.path.normcase(os.path.normpath(ruta))
+        for raiz in (i for i in range(len(self)) if self.padres[i] < 0):
+            base = os.path.normcase(os.path.normpath(self.nombre(raiz)))
+            if clave != base and not clave.startswith(base.rstrip(os.sep) + os.sep):
+                continue
+            indice = raiz
+            for nombre in clave[len(base):].strip(os.sep).split(os.sep) if clave != base else []:
+                # Los hijos siempre van después del padre y antes del final de su subárbol
+                indice = next((i for i in range(indice + 1, self._fin_subarbol(indice))
+                               if self.padres[i] == indice and os.path.normcase(self.nombre(i)) == nombre), None)
+                if indice is None:
+                    break
+            if indice is not None:
+                return indice
+        return None
+    
+    def _fin_subarbol(self, indice):
+        """El subárbol de indice ocupa los índices contiguos [indice, fin)"""
+        fin = indice + 1
+        while fin < len(self) and self.padres[fin] >= indice:
+            fin += 1
+        return fin
+    
+    def actualizar_carpeta(self, ruta):
+        """Vuelve a medir una carpeta del árbol y corrige su subárbol y sus carpetas padre.
+        
+        Sirve para refrescar lo limpiado sin repetir el análisis completo: las subcarpetas nuevas
+        cuentan en la carpeta medida y las extensiones se recalculan en el siguiente análisis.
+        Devuelve False si la carpeta no está en el árbol.
+        """
+        self.acumular()
+        indice = self.buscar(ruta)
+        if indice is None:
+            return False
+        base = self.ruta(indice)
+        totales = {}
+        for archivo, st, _ in recorrer_archivos(base):
+            directorio = os.path.dirname(archivo)
+            while True:
+                total = totales.setdefault(directorio, [0, 0])
+                total[0] += st.st_size
+                total[1] += 1
+                if len(directorio) <= len(base):
+                    break
+                directorio = os.path.dirname(directorio)
+        
+        diferencia_tamaño = totales.get(base, [0, 0])[0] - self.tamaños[indice]
+        diferencia_archivos = totales.get(base, [0, 0])[1] - self.archivos[indice]
+        for i in range(indice, self._fin_subarbol(indice)):
+            self.tamaños[i], self.archivos[i] = totales.get(self.ruta(i), (0, 0))
+        padre = self.padres[indice]
+        while padre >= 0:
+            self.tamaños[padre] += diferencia_tamaño
+            self.archivos[padre] += diferencia_archivos
+            padre = self.padres[padre]
+        return True
+    
+    def mas_pesados(self, n=10, incluir_raices=False):
+        """Devuelve [(tamaño, archivos, ruta)] de las n carpetas más pesadas"""
+        indices = range(len(self)) if incluir_raices else (i for i in range(len(self)) if self.padres[i] >= 0)
+        mejores = heapq.nlargest(n, indices, key=self.tamaños.__getitem__)
+        return [(self.tamaños[i], self.archivos[i], self.ruta(i)) for i in mejores]
+    
+    def por_extension(self, n=10):
+        """Devuelve [(extensión, bytes, archivos)] de las n extensiones que más ocupan"""
+        mejores = heapq.nlargest(n, self.extensiones.items(), key=lambda x: x[1][0])
+        return [(extension, total[0], total[1]) for extension, total in mejores]
+    
+    def guardar(self, ruta=ARBOL_ARCHIVO):
+        self.acumular()
+        cabecera = {"nodos": len(self), "nombres": len(self.nombres), "extensiones": self.extensiones,
+                    "orden": sys.byteorder,
+                    "formato": [[datos.typecode, datos.itemsize]
+                                for datos in (self.padres, self.offsets, self.tamaños, self.archivos)]}
+        with open(ruta, 'wb') as f:
+            f.write(self.MAGICO)
+            f.write(json.dumps(cabecera).encode('utf-8') + b'\n')
+            for datos in (self.padres, self.offsets, self.tamaños, self.archivos):
+                datos.tofile(f)
+            f.write(self.nombres)
+    
+    @classmethod
+    def cargar(cls, ruta=ARBOL_ARCHIVO):
+        arbol = cls()
+        with open(ruta, 'rb') as f:
+            if f.readline() != cls.MAGICO:
+                raise ValueError(f"{ruta} no es un árbol de directorios válido")
+            cabecera = json.loads(f.readline())
+            columnas = []
+            for tipo, tamaño_item in cabecera["formato"]:
+                # El tamaño de 'i', 'l'... depende de la plataforma: buscar el equivalente local
+                tipos = cls.TIPOS_CON_SIGNO if tipo.islower() else cls.TIPOS_SIN_SIGNO
+                local = next((t for t in tipos if array.array(t).itemsize == tamaño_item), None)
+                if local is None:
+                    raise ValueError(f"{ruta}: enteros de {tamaño_item} bytes no soportados")
+                datos = array.array(local)
+                datos.fromfile(f, cabecera["nodos"])
+                if cabecera["orden"] != sys.byteorder:
+                    datos.byteswap()
+                columnas.append(datos)
+            arbol.padres, arbol.offsets, arbol.tamaños, arbol.archivos = columnas
+            arbol.nombres = bytearray(f.read(cabecera["nombres"]))
+        arbol.extensiones = cabecera["extensiones"]
+        arbol.acumulado = True
+        return arbol
+
+ultimo_arbol = None
+
 def analizar_disco(solo_detect=False):
     """Identifica archivos grandes y temporales antiguos (solo detección)"""
     print(f"\n{Colors.YELLOW}Analizando disco...{Colors.END}")
@@ -373,6 +1251,9 @@ def analizar_disco(solo_detect=False):
     
     archivos_grandes = []
     archivos_protegidos = ["pagefile.sys", "hiberfil.sys", "swapfile.sys"]
+    vistos = set()  # Identidades ya contadas (enlaces duros)
+    total_logico = total_asignado = 0
+    arbol = ArbolDirectorios()
     
     for unidad in unidades:
         print(f"{Colors.BLUE}Escaneando {unidad}...{Colors.END}")
@@ -391,33 +1272,238 @@ def analizar_disco(solo_detect=False):
             if not os.path.exists(directorio):
                 continue
                 
-            for raiz, _, archivos in os.walk(directorio):
-                for archivo in archivos:
-                    # Saltar archivos protegidos del sistema
-                    if archivo.lower() in archivos_protegidos:
-                        continue
-                        
-                    try:
-                        ruta_completa = os.path.join(raiz, archivo)
-                        tamaño = os.path.getsize(ruta_completa)
-                        
-                        # Archivos grandes (>100MB)
-                        if tamaño > 100 * 1024 * 1024:  # 100MB
-                            archivos_grandes.append((ruta_completa, tamaño))
-                    except:
-                        continue
+            arbol.agregar_raiz(directorio)
+            for ruta_completa, st, asignado in recorrer_archivos(directorio, vistos=vistos):
+                # Saltar archivos protegidos del sistema
+                if os.path.basename(ruta_completa).lower() in archivos_protegidos:
+                    continue
+                
+                tamaño = st.st_size
+                total_logico += tamaño
+                total_asignado += asignado
+                arbol.agregar_archivo(ruta_completa, tamaño)
+                
+                # Archivos grandes (>100MB)
+                if tamaño > 100 * 1024 * 1024:  # 100MB
+                    archivos_grandes.append((ruta_completa, tamaño))
     
     # Ordenar por tamaño descendente
     archivos_grandes.sort(key=lambda x: x[1], reverse=True)
     
+    logger.info(f"Espacio escaneado: {bytes_a_gb(total_logico)} GB lógicos, {bytes_a_gb(total_asignado)} GB asignados")
+    
+    # Árbol de tamaños por carpeta para reutilizar sin volver a escanear
+    global ultimo_arbol
+    arbol.acumular()
+    ultimo_arbol = arbol
+    try:
+        arbol.guardar()
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el árbol de directorios: {str(e)}")
+    
     if not solo_detect:
+        print(f"\n{Colors.CYAN}Espacio escaneado: {bytes_a_gb(total_logico)} GB lógicos, "
+              f"{bytes_a_gb(total_asignado)} GB asignados en disco{Colors.END}")
         print(f"\n{Colors.YELLOW}Archivos grandes detectados (>100MB):{Colors.END}")
         logger.info(f"Archivos grandes detectados: {len(archivos_grandes)}")
         for archivo, tamaño in archivos_grandes[:10]:
             print(f"{bytes_a_mb(tamaño)} MB: {archivo}")
+        
+        print(f"\n{Colors.YELLOW}Carpetas más pesadas:{Colors.END}")
+        for tamaño, archivos, carpeta in arbol.mas_pesados(10):
+            print(f"{bytes_a_mb(tamaño)} MB ({archivos} archivos): {carpeta}")
+        
+        print(f"\n{Colors.YELLOW}Espacio por extensión:{Colors.END}")
+        for extension, tamaño, archivos in arbol.por_extension(5):
+            print(f"{bytes_a_mb(tamaño)} MB ({archivos} archivos): {extension}")
     
     return archivos_grandes
 
+def cargar_ultimo_arbol():
+    """Devuelve el último árbol calculado, leyéndolo de ARBOL_ARCHIVO si no está en memoria (None si no hay)"""
+    global ultimo_arbol
+    if ultimo_arbol is None:
+        try:
+            ultimo_arbol = ArbolDirectorios.cargar()
+        except (OSError, ValueError, EOFError, KeyError) as e:
+            logger.warning(f"No se pudo cargar el árbol de directorios: {str(e)}")
+    return ultimo_arbol
+
+def mostrar_ultimo_analisis(n=10):
+    """Muestra las carpetas y extensiones más pesadas del último análisis sin volver a escanear"""
+    arbol = cargar_ultimo_arbol()
+    if arbol is None:
+        print(f"\n{Colors.RED}No hay ningún análisis guardado: ejecuta antes el análisis de disco{Colors.END}")
+        return None
+    try:
+        fecha = datetime.fromtimestamp(os.path.getmtime(ARBOL_ARCHIVO)).strftime('%Y-%m-%d %H:%M')
+    except OSError:
+        fecha = "esta sesión"
+    print(f"\n{Colors.YELLOW}Carpetas más pesadas (análisis de {fecha}):{Colors.END}")
+    for tamaño, archivos, carpeta in arbol.mas_pesados(n):
+        print(f"{bytes_a_mb(tamaño)} MB ({archivos} archivos): {carpeta}")
+    
+    print(f"\n{Colors.YELLOW}Espacio por extensión:{Colors.END}")
+    for extension, tamaño, archivos in arbol.por_extension(n):
+        print(f"{bytes_a_mb(tamaño)} MB ({archivos} archivos): {extension}")
+    return arbol
+
+# --- DETECCIÓN DE ARCHIVOS DUPLICADOS --- #
+def _hash_parcial(ruta, tamaño):
+    """Hash del primer y último bloque del archivo"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        h.update(f.read(DUPLICADOS_BLOQUE_PARCIAL))
+        if tamaño > DUPLICADOS_BLOQUE_PARCIAL:
+            f.seek(max(DUPLICADOS_BLOQUE_PARCIAL, tamaño - DUPLICADOS_BLOQUE_PARCIAL))
+            h.update(f.read(DUPLICADOS_BLOQUE_PARCIAL))
+    return h.hexdigest()
+
+def _hash_completo(ruta):
+    """Hash de todo el contenido leyendo el archivo mapeado en memoria (se ejecuta en el pool)"""
+    h = hashlib.blake2b(digest_size=20)
+    try:
+        with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            with memoryview(mapa) as vista:
+                for inicio in range(0, len(vista), DUPLICADOS_BLOQUE_LECTURA):
+                    h.update(vista[inicio:inicio + DUPLICADOS_BLOQUE_LECTURA])
+    except (OSError, ValueError):
+        return ruta, None
+    return ruta, h.hexdigest()
+
+_cache_hashes = None  # Se mantiene en memoria entre búsquedas del mismo proceso
+
+def _leer_cache_hashes():
+    try:
+        with open(DUPLICADOS_CACHE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def cargar_cache_hashes():
+    global _cache_hashes
+    if _cache_hashes is None:
+        _cache_hashes = _leer_cache_hashes()
+    return _cache_hashes
+
+def _entrada_vigente(clave):
+    """Indica si el archivo de una clave "ruta|tamaño|mtime_ns" sigue sin cambios"""
+    ruta, tamaño, mtime_ns = clave.rsplit('|', 2)
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return False
+    return str(st.st_size) == tamaño and str(st.st_mtime_ns) == mtime_ns
+
+def guardar_cache_hashes(cache, vigentes=()):
+    """Fusiona cache con la guardada en disco y descarta las entradas de archivos borrados o modificados.
+    
+    vigentes son claves que se acaban de comprobar y no hace falta volver a consultar.
+    """
+    global _cache_hashes
+    fusion = _leer_cache_hashes()
+    fusion.update(cache)
+    vigentes = set(vigentes)
+    _cache_hashes = {clave: valor for clave, valor in fusion.items()
+                     if valor and (clave in vigentes or _entrada_vigente(clave))}
+    try:
+        with open(DUPLICADOS_CACHE, 'w', encoding='utf-8') as f:
+            json.dump(_cache_hashes, f)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar la caché de hashes: {str(e)}")
+
+def _agrupar_por(rutas, clave):
+    grupos = {}
+    for ruta in rutas:
+        valor = clave(ruta)
+        if valor is not None:
+            grupos.setdefault(valor, []).append(ruta)
+    return [grupo for grupo in grupos.values() if len(grupo) > 1]
+
+def buscar_duplicados(directorios=None, tamaño_minimo=DUPLICADOS_TAMAÑO_MINIMO, procesos=None):
+    """Busca archivos duplicados por etapas: tamaño, hash parcial y hash completo.
+    
+    Devuelve una lista de (bytes_recuperables, tamaño, rutas) ordenada de mayor a menor.
+    """
+    if directorios is None:
+        directorios = []
+        for particion in psutil.disk_partitions():
+            if 'fixed' in particion.opts:
+                directorios.append(os.path.join(particion.mountpoint, 'Users'))
+                directorios.append(os.path.join(particion.mountpoint, 'ProgramData'))
+    
+    # Etapa 1: agrupar por tamaño (los enlaces duros ya salen deduplicados del recorrido)
+    por_tamaño = {}
+    info = {}  # ruta -> clave de caché (ruta, tamaño, mtime)
+    tamaños = {}
+    vistos = set()
+    for directorio in directorios:
+        if not os.path.exists(directorio):
+            continue
+        logger.info(f"Buscando duplicados en {directorio}")
+        for ruta, st, _ in recorrer_archivos(directorio, vistos=vistos):
+            if st.st_size >= tamaño_minimo:
+                por_tamaño.setdefault(st.st_size, []).append(ruta)
+                info[ruta] = f"{ruta}|{st.st_size}|{st.st_mtime_ns}"
+                tamaños[ruta] = st.st_size
+    candidatos = [grupo for grupo in por_tamaño.values() if len(grupo) > 1]
+    logger.info(f"Duplicados: {sum(len(g) for g in candidatos)} archivos con tamaño repetido")
+    
+    cache = cargar_cache_hashes()
+    
+    # Etapa 2: hash del primer y último bloque
+    def parcial(ruta):
+        entrada = cache.setdefault(info[ruta], {})
+        if 'parcial' not in entrada:
+            pausa_suave()
+            try:
+                entrada['parcial'] = _hash_parcial(ruta, tamaños[ruta])
+            except OSError:
+                return None
+        return entrada['parcial']
+    
+    candidatos = [sub for grupo in candidatos for sub in _agrupar_por(grupo, parcial)]
+    
+    # Etapa 3: hash completo solo de los candidatos restantes
+    pendientes = [ruta for grupo in candidatos for ruta in grupo if 'completo' not in cache[info[ruta]]]
+    logger.info(f"Duplicados: {len(pendientes)} archivos requieren hash completo")
+    if modo_suave is not None or len(pendientes) < 4:
+        # En modo suave se hashea en este proceso para respetar el límite de ritmo
+        resultados = []
+        for ruta in pendientes:
+            pausa_suave()
+            resultados.append(_hash_completo(ruta))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = list(pool.map(_hash_completo, pendientes, chunksize=4))
+    for ruta, digest in resultados:
+        if digest is not None:
+            cache[info[ruta]]['completo'] = digest
+    
+    grupos = []
+    for grupo in candidatos:
+        for iguales in _agrupar_por(grupo, lambda ruta: cache[info[ruta]].get('completo')):
+            tamaño = tamaños[iguales[0]]
+            grupos.append((tamaño * (len(iguales) - 1), tamaño, sorted(iguales)))
+    
+    guardar_cache_hashes(cache, vigentes=info.values())
+    
+    grupos.sort(key=lambda x: x[0], reverse=True)
+    return grupos
+
+def mostrar_duplicados():
+    """Busca duplicados en Users y ProgramData y muestra el espacio recuperable"""
+    print(f"\n{Colors.YELLOW}Buscando archivos duplicados...{Colors.END}")
+    grupos = buscar_duplicados()
+    total = sum(recuperable for recuperable, _, _ in grupos)
+    print(f"\n{Colors.CYAN}Grupos de duplicados: {len(grupos)} ({bytes_a_mb(total)} MB recuperables){Colors.END}")
+    logger.info(f"Duplicados: {len(grupos)} grupos, {bytes_a_mb(total)} MB recuperables")
+    for recuperable, tamaño, rutas in grupos[:10]:
+        print(f"\n{bytes_a_mb(recuperable)} MB recuperables: {len(rutas)} copias de {bytes_a_mb(tamaño)} MB")
+        for ruta in rutas:
+            print(f"  {ruta}")
+    return grupos
+
 # --- FUNCIONES DE OPTIMIZACIÓN --- #
 @retry_on_error()
 def ejecutar_cleanmgr():
@@ -523,28 +1609,28 @@ def configurar_alto_rendimiento():
         return f"Error: {str(e)}"
 
 # --- FUNCIÓN PARA EJECUTAR EL PLAN --- #
+# Mapeo de nombres descriptivos a nombres técnicos
+MAPEO_ACCIONES = {
+    "limpieza_temporales": "limpieza_temporales",
+    "gestion_programas_inicio": "optimizar_arranque",
+    "analisis_disco": "analizar_disco",
+    "optimizacion_servicios": "optimizar_servicios",
+    "configuracion_energia": "configurar_alto_rendimiento",
+    "limpieza_cache_navegadores": "limpiar_cache_navegadores",
+    "vaciar_papelera": "vaciar_papelera",
+    "ejecutar_cleanmgr": "ejecutar_cleanmgr"
+}
+
 def ejecutar_plan_optimizacion(plan):
     """Ejecuta las acciones recomendadas por Phi3-mini"""
     resultados = {}
     
-    # Mapeo de nombres descriptivos a nombres técnicos
-    mapeo_acciones = {
-        "limpieza_temporales": "limpieza_temporales",
-        "gestion_programas_inicio": "optimizar_arranque",
-        "analisis_disco": "analizar_disco",
-        "optimizacion_servicios": "optimizar_servicios",
-        "configuracion_energia": "configurar_alto_rendimiento",
-        "limpieza_cache_navegadores": "limpiar_cache_navegadores",
-        "vaciar_papelera": "vaciar_papelera",
-        "ejecutar_cleanmgr": "ejecutar_cleanmgr"
-    }
-    
     for accion in plan.get('acciones', []):
         accion_tipo = accion['tipo']
         intensidad = accion.get('intensidad', 'media')
         
         # Convertir a nombre técnico
-        accion_tecnica = mapeo_acciones.get(accion_tipo.lower(), accion_tipo)
+        accion_tecnica = MAPEO_ACCIONES.get(accion_tipo.lower(), accion_tipo)
         
         print(f"\n{Colors.YELLOW}>>> Ejecutando: {accion_tipo} -> {accion_tecnica} ({intensidad}){Colors.END}")
         logger.info(f"Ejecutando acción: {accion_tipo} ({accion_tecnica}) con intensidad {intensidad}")
@@ -599,9 +1685,10 @@ def ejecutar_plan_optimizacion(plan):
 @retry_on_error()
 def optimizar_arranque_auto(intensidad="media"):
     """Deshabilita programas de inicio automáticamente basado en heurística"""
+    subclave = r"Software\Microsoft\Windows\CurrentVersion\Run"
+    iniciar_ejecucion_cuarentena()
     try:
-        clave = winreg.OpenKey(winreg.HKEY_CURRENT_USER, 
-                              r"Software\Microsoft\Windows\CurrentVersion\Run")
+        clave = winreg.OpenKey(winreg.HKEY_CURRENT_USER, subclave)
         
         deshabilitados = []
         conservados = []
@@ -609,9 +1696,12 @@ def optimizar_arranque_auto(intensidad="media"):
         i = 0
         while True:
             try:
-                nombre, valor, _ = winreg.EnumValue(clave, i)
+                nombre, valor, tipo = winreg.EnumValue(clave, i)
                 # Heurística: deshabilitar programas poco comunes o de terceros
                 if intensidad == "alta" or "update" in nombre.lower() or "cloud" in nombre.lower():
+                    # Anotar antes de borrar: si el diario falla, el valor no se pierde
+                    if cuarentena is not None:
+                        cuarentena.anotar_valor_registro(subclave, nombre, valor, tipo)
                     winreg.DeleteValue(clave, nombre)
                     deshabilitados.append(nombre)
                     logger.info(f"Deshabilitado programa de inicio: {nombre}")
@@ -663,22 +1753,137 @@ def generar_reporte_sistema():
             continue
         try:
             for entry in os.scandir(directorio):
-                if entry.is_file() and entry.stat().st_size > 100 * 1024 * 1024:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_size > 100 * 1024 * 1024:
                     reporte += f"- {bytes_a_mb(entry.stat().st_size)} MB: {entry.path}\n"
         except:
             continue
     
+    # Espacio recuperable estimado por muestreo (sin recorrer todo el disco)
+    reporte += "\n--- Espacio Recuperable Estimado ---\n"
+    intensidades = ("media", "alta")
+    presupuesto = ESTIMACION_TIEMPO_LIMITE / (2 * len(intensidades))
+    listados = {}  # Cada carpeta se lee una sola vez para todas las intensidades
+    for intensidad in intensidades:
+        temporales = estimar_limpieza_temporales(intensidad, presupuesto, listados)
+        caches = estimar_cache_navegadores(intensidad, presupuesto, listados)
+        reporte += f"Intensidad {intensidad}: temporales {_texto_estimacion(temporales)}, "
+        reporte += f"cachés {_texto_estimacion(caches)}\n"
+    
     return reporte
 
 # --- FUNCIONES AUXILIARES --- #
+def es_enlace(st):
+    """Indica si un stat obtenido sin seguir enlaces es un symlink o un punto de reanálisis (junction)"""
+    if stat.S_ISLNK(st.st_mode):
+        return True
+    return bool(getattr(st, 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+
+@lru_cache(maxsize=None)
+def _tamaño_cluster(unidad):
+    """Tamaño de clúster del volumen (Windows); 4 KB si no se puede consultar"""
+    try:
+        sectores = ctypes.c_ulong()
+        bytes_sector = ctypes.c_ulong()
+        libres = ctypes.c_ulong()
+        total = ctypes.c_ulong()
+        if ctypes.windll.kernel32.GetDiskFreeSpaceW(unidad, ctypes.byref(sectores), ctypes.byref(bytes_sector),
+                                                    ctypes.byref(libres), ctypes.byref(total)):
+            return sectores.value * bytes_sector.value
+    except Exception:
+        pass
+    return 4096
+
+def tamaño_asignado(ruta, st):
+    """Espacio ocupado en disco por un archivo (clústeres asignados), distinto del tamaño lógico"""
+    if hasattr(st, 'st_blocks'):
+        return st.st_blocks * 512
+    
+    tamaño = st.st_size
+    atributos = getattr(st, 'st_file_attributes', 0)
+    if atributos & (stat.FILE_ATTRIBUTE_COMPRESSED | stat.FILE_ATTRIBUTE_SPARSE_FILE):
+        # Archivos comprimidos o dispersos ocupan menos que su tamaño lógico
+        try:
+            obtener = ctypes.windll.kernel32.GetCompressedFileSizeW
+            obtener.restype = ctypes.c_ulong
+            alto = ctypes.c_ulong()
+            bajo = obtener(ruta, ctypes.byref(alto))
+            if bajo != 0xFFFFFFFF or ctypes.GetLastError() == 0:
+                tamaño = (alto.value << 32) + bajo
+        except Exception:
+            pass
+    cluster = _tamaño_cluster(os.path.splitdrive(ruta)[0] + os.sep)
+    return -(-tamaño // cluster) * cluster
+
+def recorrer_archivos(raiz, seguir_enlaces=False, vistos=None, deduplicar=True):
+    """Recorre raiz y devuelve (ruta, stat, tamaño_asignado) por cada archivo.
+    
+    Por defecto no entra en symlinks ni junctions y devuelve cada archivo físico una sola vez
+    (identidad dispositivo/inodo), así los enlaces duros no se cuentan varias veces.
+    Pasar el mismo conjunto vistos a varias llamadas deduplica entre raíces.
+    """
+    if vistos is None:
+        vistos = set()
+    try:
+        dispositivo_raiz = os.stat(raiz).st_dev
+    except OSError as e:
+        logger.warning(f"No se puede recorrer {raiz}: {str(e)}")
+        return
+    directorios_vistos = set()
+    pendientes = [raiz]
+    
+    while pendientes:
+        directorio = pendientes.pop()
+        try:
+            entradas = list(os.scandir(directorio))
+        except OSError as e:
+            logger.warning(f"Error al acceder al directorio {directorio}: {str(e)}")
+            continue
+        
+        for entrada in entradas:
+            pausa_suave()
+            try:
+                st = entrada.stat(follow_symlinks=seguir_enlaces)
+                if stat.S_ISDIR(st.st_mode):
+                    if not seguir_enlaces:
+                        if not es_enlace(st):
+                            pendientes.append(entrada.path)
+                        continue
+                    # Siguiendo enlaces, evitar ciclos por identidad del directorio
+                    clave = (st.st_dev or dispositivo_raiz, entrada.inode() if st.st_ino == 0 else st.st_ino)
+                    if clave not in directorios_vistos:
+                        directorios_vistos.add(clave)
+                        pendientes.append(entrada.path)
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                
+                if deduplicar:
+                    identidad = st
+                    if st.st_nlink == 0:
+                        # En Windows el stat de scandir no trae st_nlink/st_ino/st_dev (valen 0)
+                        identidad = os.stat(entrada.path, follow_symlinks=False)
+                    # Solo los archivos con varios enlaces duros pueden repetirse
+                    if identidad.st_nlink > 1 and identidad.st_ino:
+                        clave = (identidad.st_dev or dispositivo_raiz, identidad.st_ino)
+                        if clave in vistos:
+                            continue
+                        vistos.add(clave)
+                asignado = tamaño_asignado(entrada.path, st)
+            except OSError:
+                continue
+            yield entrada.path, st, asignado
+
+def medir_carpeta(ruta, vistos=None):
+    """Devuelve (tamaño lógico, tamaño asignado, número de archivos) de una carpeta"""
+    logico = asignado = archivos = 0
+    for _, st, ocupado in recorrer_archivos(ruta, vistos=vistos):
+        logico += st.st_size
+        asignado += ocupado
+        archivos += 1
+    return logico, asignado, archivos
+
 def obtener_tamaño_carpeta(ruta):
-    total = 0
-    for entrada in os.scandir(ruta):
-        if entrada.is_file():
-            total += entrada.stat().st_size
-        elif entrada.is_dir():
-            total += obtener_tamaño_carpeta(entrada.path)
-    return total
+    return medir_carpeta(ruta)[0]
 
 def bytes_a_mb(bytes_size):
     return round(bytes_size / (1024 * 1024), 2)
@@ -686,6 +1891,249 @@ def bytes_a_mb(bytes_size):
 def bytes_a_gb(bytes_size):
     return round(bytes_size / (1024 * 1024 * 1024), 2)
 
+# --- MODO POR LOTES Y PROGRAMADOR RESIDENTE --- #
+# Acciones equivalentes a las opciones del menú que se pueden automatizar
+OPCIONES_MENU = {
+    "1": [("limpieza_temporales", "media")],
+    "2": [("limpieza_temporales", "media"), ("limpiar_cache_navegadores", "media")],
+    "6": [("limpieza_temporales", "media"), ("limpiar_cache_navegadores", "media"),
+          ("vaciar_papelera", "media"), ("optimizar_arranque", "media")],
+    "8": [("limpieza_temporales", "alta"), ("limpiar_cache_navegadores", "alta"),
+          ("vaciar_papelera", "alta"), ("optimizar_arranque", "alta"), ("ejecutar_cleanmgr", "alta"),
+          ("optimizar_servicios", "alta"), ("configurar_alto_rendimiento", "alta")],
+}
+
+def _resultado_texto(texto):
+    """Resultado de las funciones que devuelven un texto "Error: ..." cuando fallan"""
+    return {"resultado": texto, "ok": not texto.startswith("Error")}
+
+def ejecutar_accion(tipo, intensidad="media"):
+    """Ejecuta una acción sin interacción y devuelve un resultado serializable a JSON"""
+    accion = MAPEO_ACCIONES.get(tipo.lower(), tipo.lower())
+    if accion == "limpieza_temporales":
+        return {"bytes_liberados": limpiar_archivos_temporales(intensidad), "bytes_en_cuarentena": bytes_en_cuarentena()}
+    elif accion == "limpiar_cache_navegadores":
+        return {"bytes_liberados": limpiar_cache_navegadores(intensidad), "bytes_en_cuarentena": bytes_en_cuarentena()}
+    elif accion == "vaciar_papelera":
+        return {"ok": vaciar_papelera()}
+    elif accion == "optimizar_arranque":
+        return _resultado_texto(optimizar_arranque_auto(intensidad))
+    elif accion == "analizar_disco":
+        grandes = analizar_disco(solo_detect=True)
+        return {"archivos_grandes": [{"ruta": ruta, "bytes": tamaño} for ruta, tamaño in grandes[:20]],
+                "carpetas": [{"ruta": ruta, "bytes": tamaño, "archivos": archivos}
+                             for tamaño, archivos, ruta in ultimo_arbol.mas_pesados(20)]}
+    elif accion == "purgar_cuarentena":
+        return {"cuarentenas_purgadas": purgar_cuarentena_baja_prioridad()}
+    elif accion == "consultar_arbol":
+        arbol = cargar_ultimo_arbol()
+        if arbol is None:
+            raise ValueError("No hay ningún análisis de disco guardado")
+        return {"carpetas": [{"ruta": ruta, "bytes": tamaño, "archivos": archivos}
+                             for tamaño, archivos, ruta in arbol.mas_pesados(20)],
+                "extensiones": [{"extension": extension, "bytes": tamaño, "archivos": archivos}
+                                for extension, tamaño, archivos in arbol.por_extension(20)]}
+    elif accion == "buscar_duplicados":
+        grupos = buscar_duplicados()
+        return {"bytes_recuperables": sum(g[0] for g in grupos),
+                "grupos": [{"bytes_recuperables": recuperable, "bytes": tamaño, "rutas": rutas}
+                           for recuperable, tamaño, rutas in grupos[:20]]}
+    elif accion == "ejecutar_cleanmgr":
+        return {"ok": ejecutar_cleanmgr()}
+    elif accion == "optimizar_servicios":
+        return _resultado_texto(optimizar_servicios())
+    elif accion == "configurar_alto_rendimiento":
+        return _resultado_texto(configurar_alto_rendimiento())
+    raise ValueError(f"Acción no reconocida: {tipo}")
+
+def ejecutar_lote(acciones):
+    """Ejecuta [(tipo, intensidad)] en orden y devuelve una lista de resultados"""
+    resultados = []
+    for tipo, intensidad in acciones:
+        inicio = time.monotonic()
+        resultado = {"tipo": tipo, "intensidad": intensidad}
+        logger.info(f"Lote: ejecutando {tipo} ({intensidad})")
+        try:
+            # La salida por pantalla de las acciones va a stderr para dejar stdout solo con JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                resultado.update(ejecutar_accion(tipo, intensidad))
+            resultado["ok"] = resultado.get("ok", True)
+        except Exception as e:
+            logger.error(f"Lote: error en {tipo}: {str(e)}")
+            resultado.update({"ok": False, "error": str(e)})
+        resultado["duracion_s"] = round(time.monotonic() - inicio, 2)
+        resultados.append(resultado)
+    return resultados
+
+def _particiones_fijas():
+    return [p.mountpoint for p in psutil.disk_partitions() if 'fixed' in p.opts]
+
+def _uso_disco(unidades):
+    uso = {}
+    for unidad in unidades:
+        try:
+            uso[unidad] = psutil.disk_usage(unidad).percent
+        except OSError:
+            continue
+    return uso
+
+def _carpetas_de_accion(tipo, intensidad):
+    """Carpetas en las que una acción de limpieza libera espacio"""
+    accion = MAPEO_ACCIONES.get(tipo.lower(), tipo.lower())
+    if accion == "limpieza_temporales":
+        return _raices_existentes(obtener_directorios_temporales(intensidad))
+    if accion == "limpiar_cache_navegadores":
+        return _raices_existentes([cache_dir for _, cache_dir in obtener_caches_navegadores()])
+    if accion == "vaciar_papelera":
+        return _particiones_fijas()  # Hay una papelera en cada unidad
+    return []
+
+def _unidad_de(ruta, unidades):
+    """Punto de montaje de unidades que contiene ruta (el más largo que coincida)"""
+    ruta = os.path.normcase(os.path.abspath(ruta))
+    candidatas = [u for u in unidades if ruta.startswith(os.path.normcase(u).rstrip(os.sep) + os.sep)
+                  or ruta == os.path.normcase(u)]
+    return max(candidatas, key=len, default=None)
+
+def ejecutar_programador(acciones=None, umbral=PROGRAMADOR_UMBRAL, intervalo=PROGRAMADOR_INTERVALO,
+                         histeresis=PROGRAMADOR_HISTERESIS):
+    """Proceso residente: vigila el uso de disco y limpia de forma incremental al superar el umbral.
+    
+    Solo vigila las unidades en las que las acciones pueden liberar espacio. Las acciones se
+    ejecutan de una en una y se para en cuanto esas unidades bajan de umbral - histeresis. Si un
+    ciclo no consigue bajar del umbral, la espera hasta el siguiente se duplica (hasta
+    PROGRAMADOR_ESPERA_MAXIMA) para no repetir limpiezas inútiles. El último árbol de tamaños y
+    la caché de hashes se cargan al iniciar y se refrescan tras cada ciclo.
+    """
+    if acciones is None:
+        acciones = PROGRAMADOR_ACCIONES
+    
+    fijas = _particiones_fijas()
+    unidades = sorted({unidad for tipo, intensidad in acciones for carpeta in _carpetas_de_accion(tipo, intensidad)
+                       for unidad in [_unidad_de(carpeta, fijas)] if unidad})
+    if not unidades:
+        logger.error("Programador: ninguna acción libera espacio en una unidad fija")
+        return
+    arbol = cargar_ultimo_arbol()
+    cargar_cache_hashes()
+    logger.info(f"Programador iniciado: umbral {umbral}%, intervalo {intervalo}s, unidades {unidades}, "
+                f"árbol {'cargado' if arbol is not None else 'no disponible'}")
+    espera = intervalo
+    proximo_ciclo = 0.0
+    try:
+        while True:
+            uso = _uso_disco(unidades)
+            if not any(porcentaje >= umbral for porcentaje in uso.values()):
+                espera = intervalo
+                proximo_ciclo = 0.0
+            elif time.monotonic() >= proximo_ciclo:
+                logger.info(f"Programador: umbral superado {uso}")
+                iniciar_purga_en_segundo_plano()
+                resultados = []
+                limpiadas = set()
+                uso_final = uso
+                for accion in acciones:
+                    resultados.extend(ejecutar_lote([accion]))
+                    limpiadas.update(_carpetas_de_accion(*accion))
+                    uso_final = _uso_disco(unidades)
+                    if all(porcentaje < umbral - histeresis for porcentaje in uso_final.values()):
+                        break
+                print(json.dumps({"fecha": datetime.now().isoformat(timespec='seconds'), "uso_inicial": uso,
+                                  "uso_final": uso_final, "acciones": resultados}), flush=True)
+                _refrescar_indices(arbol, limpiadas)
+                
+                # Sin mejora: esperar cada vez más antes de repetir el ciclo
+                if any(porcentaje >= umbral for porcentaje in uso_final.values()):
+                    proximo_ciclo = time.monotonic() + espera
+                    logger.info(f"Programador: umbral aún superado, siguiente ciclo en {espera}s")
+                    espera = min(espera * 2, PROGRAMADOR_ESPERA_MAXIMA)
+                else:
+                    espera = intervalo
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        logger.info("Programador detenido")
+
+def _refrescar_indices(arbol, carpetas):
+    """Actualiza el árbol guardado y la caché de hashes con lo que ha cambiado en carpetas"""
+    if arbol is not None:
+        actualizadas = [carpeta for carpeta in carpetas if arbol.actualizar_carpeta(carpeta)]
+        if actualizadas:
+            try:
+                arbol.guardar()
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el árbol de directorios: {str(e)}")
+    # Descarta de la caché los hashes de los archivos borrados
+    guardar_cache_hashes(cargar_cache_hashes())
+
+def _parsear_acciones(textos, intensidad):
+    """Convierte ['tipo[:intensidad]', ...] en [(tipo, intensidad)]"""
+    acciones = []
+    for texto in textos:
+        tipo, _, propia = texto.partition(':')
+        if propia and propia not in ("baja", "media", "alta"):
+            raise ValueError(f"intensidad no válida en '{texto}' (baja, media o alta)")
+        acciones.append((tipo, propia or intensidad))
+    return acciones
+
+def main_lote(argv):
+    """Punto de entrada sin menú: ejecuta acciones y escribe los resultados en JSON"""
+    parser = argparse.ArgumentParser(description="Optimizador Windows sin interacción (resultados en JSON)")
+    parser.add_argument('--acciones', nargs='+', metavar='TIPO[:INTENSIDAD]',
+                        help="Acciones a ejecutar, p. ej. limpieza_temporales:alta vaciar_papelera "
+                             "(vaciar_papelera borra definitivamente, también con --cuarentena)")
+    parser.add_argument('--opcion', choices=sorted(OPCIONES_MENU), help="Ejecuta las acciones de una opción del menú")
+    parser.add_argument('--intensidad', choices=['baja', 'media', 'alta'], default='media')
+    parser.add_argument('--suave', action='store_true', help="Modo suave (baja prioridad)")
+    parser.add_argument('--cuarentena', action='store_true', help="Mover a cuarentena en lugar de borrar")
+    parser.add_argument('--restaurar', nargs='?', const='', metavar='ID',
+                        help="Restaura una sesión de cuarentena (la última si no se indica ID) y termina")
+    parser.add_argument('--residente', action='store_true', help="Vigilar el uso de disco y limpiar al superar el umbral")
+    parser.add_argument('--umbral', type=float, default=PROGRAMADOR_UMBRAL)
+    parser.add_argument('--histeresis', type=float, default=PROGRAMADOR_HISTERESIS)
+    parser.add_argument('--intervalo', type=float, default=PROGRAMADOR_INTERVALO)
+    args = parser.parse_args(argv)
+    
+    if args.restaurar is not None:
+        resultado = _resultado_texto(restaurar_cuarentena(args.restaurar or None))
+        resultado["ok"] = resultado["ok"] and resultado["resultado"].endswith("Errores: 0")
+        resultado["cuarentenas"] = [{"sesion": sesion, "diarios": diarios, "elementos": elementos, "bytes": tamaño}
+                                    for sesion, diarios, elementos, tamaño in listar_cuarentenas()]
+        print(json.dumps(resultado, indent=2))
+        return 0 if resultado["ok"] else 1
+    
+    acciones = []
+    if args.opcion:
+        acciones.extend(OPCIONES_MENU[args.opcion])
+    if args.acciones:
+        try:
+            acciones.extend(_parsear_acciones(args.acciones, args.intensidad))
+        except ValueError as e:
+            parser.error(str(e))
+    if not acciones and not args.residente:
+        parser.error("indica --acciones, --opcion o --residente")
+    if args.residente and args.cuarentena:
+        # Lo movido a cuarentena sigue ocupando la unidad: el uso no bajaría del umbral
+        parser.error("--cuarentena no se puede usar con --residente")
+    
+    if not es_admin():
+        logger.warning("Modo por lotes sin permisos de administrador")
+    if args.suave:
+        activar_modo_suave()
+    if args.cuarentena:
+        activar_cuarentena()
+    
+    if args.residente:
+        ejecutar_programador(acciones or None, args.umbral, args.intervalo, args.histeresis)
+        return 0
+    
+    iniciar_sesion_cuarentena()
+    resultados = ejecutar_lote(acciones)
+    # Sin proceso residente: la purga de cuarentenas caducadas se hace aquí antes de salir
+    purgadas = purgar_cuarentena_baja_prioridad()
+    print(json.dumps({"fecha": datetime.now().isoformat(timespec='seconds'), "admin": bool(es_admin()),
+                      "acciones": resultados, "cuarentenas_purgadas": purgadas}, indent=2))
+    return 0 if all(r["ok"] for r in resultados) else 1
+
 # --- INTERFAZ PRINCIPAL --- #
 def mostrar_menu():
     print(f"\n{Colors.YELLOW}=== OPTIMIZADOR WINDOWS CON PHI3-MINI ===")
@@ -697,6 +2145,12 @@ def mostrar_menu():
     print("6. Optimización completa tradicional")
     print("7. Auto-optimización con Phi3-mini (Ollama)")
     print("8. Optimización profunda (todas las funciones)")
+    print(f"10. Modo suave (baja prioridad): {'ACTIVADO' if modo_suave else 'DESACTIVADO'}")
+    print("11. Vista previa del espacio recuperable (estimación rápida)")
+    print("12. Buscar archivos duplicados")
+    print(f"13. Cuarentena en lugar de borrado: {'ACTIVADA' if cuarentena_activa else 'DESACTIVADA'}")
+    print("14. Restaurar una cuarentena")
+    print("15. Consultar el último análisis de disco (sin volver a escanear)")
     print(f"9. Salir{Colors.END}")
 
 def main():
@@ -722,10 +2176,12 @@ def main():
             modelo_instalado = False
     
     logger.info("Inicio del optimizador")
+    iniciar_purga_en_segundo_plano()
     while True:
         mostrar_menu()
         opcion = input("\nSeleccione una opción: ")
         logger.info(f"Opción seleccionada: {opcion}")
+        iniciar_sesion_cuarentena()
 
         if opcion == "1":
             espacio = limpiar_archivos_temporales()
@@ -808,6 +2264,47 @@ def main():
             print(f"- Energía: {energia_result}")
             logger.info("Optimización profunda completada")
             
+        elif opcion == "10":
+            if modo_suave:
+                desactivar_modo_suave()
+                print(f"\n{Colors.GREEN}✓ Modo suave desactivado{Colors.END}")
+            else:
+                activar_modo_suave()
+                print(f"\n{Colors.GREEN}✓ Modo suave activado: limpieza a baja prioridad y ritmo limitado{Colors.END}")
+                
+        elif opcion == "11":
+            mostrar_estimacion_recuperable()
+                
+        elif opcion == "12":
+            mostrar_duplicados()
+                
+        elif opcion == "13":
+            if cuarentena_activa:
+                desactivar_cuarentena()
+                print(f"\n{Colors.GREEN}✓ Cuarentena desactivada: las limpiezas borran directamente{Colors.END}")
+            else:
+                activar_cuarentena()
+                print(f"\n{Colors.GREEN}✓ Cuarentena activada: se purgará tras {CUARENTENA_RETENCION_DIAS} días{Colors.END}")
+                
+        elif opcion == "14":
+            sesiones = listar_cuarentenas()[:10]
+            if not sesiones:
+                print(f"\n{Colors.YELLOW}No hay cuarentenas para restaurar{Colors.END}")
+                continue
+            print(f"\n{Colors.CYAN}Cuarentenas (de la más reciente a la más antigua):{Colors.END}")
+            for i, (sesion, diarios, elementos, tamaño) in enumerate(sesiones, 1):
+                fecha = datetime.strptime(sesion, Cuarentena.FORMATO_ID).strftime('%Y-%m-%d %H:%M:%S')
+                print(f"{i}. {fecha}: {elementos} elementos, {bytes_a_mb(tamaño)} MB ({len(diarios)} limpiezas)")
+            eleccion = input("Número a restaurar (Enter = la más reciente): ").strip() or "1"
+            if not eleccion.isdigit() or not 1 <= int(eleccion) <= len(sesiones):
+                print(f"\n{Colors.RED}Opción inválida{Colors.END}")
+                continue
+            resultado = restaurar_cuarentena(sesiones[int(eleccion) - 1][0])
+            print(f"\n{Colors.GREEN}✓ {resultado}{Colors.END}")
+                
+        elif opcion == "15":
+            mostrar_ultimo_analisis()
+                
         elif opcion == "9":
             print("\n¡Hasta luego!")
             logger.info("Fin del optimizador")
@@ -818,6 +2315,9 @@ def main():
             logger.warning(f"Opción inválida: {opcion}")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main_lote(sys.argv[1:]))
+    
     # Instrucciones iniciales
     print(f"{Colors.CYAN}Optimizador Windows con Phi3-mini (2.2GB RAM){Colors.END}")
     print(f"Modelo actual: {MODEL_NAME}")
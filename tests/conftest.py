@@ -0,0 +1,9 @@
+import os
+import sys
+import types
+
+# optimizador importa winreg al cargar; fuera de Windows basta un módulo vacío
+if sys.platform != 'win32':
+    sys.modules.setdefault('winreg', types.ModuleType('winreg'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
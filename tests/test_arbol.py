@@ -0,0 +1,82 @@
+import os
+import shutil
+
+import pytest
+
+import optimizador
+
+
+@pytest.fixture
+def carpeta(tmp_path):
+    for relativa, tamaño in [('a/b/c/x.log', 100), ('a/b/d/y.txt', 200), ('a/e/z.txt', 300), ('f/w.bin', 400)]:
+        ruta = tmp_path / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(b'0' * tamaño)
+    return str(tmp_path)
+
+
+def _construir(raiz):
+    arbol = optimizador.ArbolDirectorios()
+    arbol.agregar_raiz(raiz)
+    for ruta, st, _ in optimizador.recorrer_archivos(raiz):
+        arbol.agregar_archivo(ruta, st.st_size)
+    arbol.acumular()
+    return arbol
+
+
+def _tamaños(arbol, raiz):
+    return {os.path.relpath(arbol.ruta(i), raiz): (arbol.tamaños[i], arbol.archivos[i]) for i in range(len(arbol))}
+
+
+def test_construir_acumula_en_las_carpetas_padre(carpeta):
+    arbol = _construir(carpeta)
+    tamaños = _tamaños(arbol, carpeta)
+    assert tamaños['.'] == (1000, 4)
+    assert tamaños['a'] == (600, 3)
+    assert tamaños[os.path.join('a', 'b')] == (300, 2)
+    assert arbol.mas_pesados(2) == [(600, 3, os.path.join(carpeta, 'a')), (400, 1, os.path.join(carpeta, 'f'))]
+    assert arbol.por_extension(2) == [('.txt', 500, 2), ('.bin', 400, 1)]
+
+
+def test_guardar_y_cargar(carpeta, tmp_path):
+    arbol = _construir(carpeta)
+    archivo = str(tmp_path / 'arbol.bin')
+    arbol.guardar(archivo)
+    cargado = optimizador.ArbolDirectorios.cargar(archivo)
+    assert _tamaños(cargado, carpeta) == _tamaños(arbol, carpeta)
+    assert cargado.por_extension() == arbol.por_extension()
+    assert cargado.mas_pesados(10) == arbol.mas_pesados(10)
+
+
+def test_cargar_rechaza_otros_archivos(tmp_path):
+    archivo = tmp_path / 'otro.bin'
+    archivo.write_bytes(b'no es un arbol\n')
+    with pytest.raises(ValueError):
+        optimizador.ArbolDirectorios.cargar(str(archivo))
+
+
+def test_actualizar_carpeta_corrige_subarbol_y_padres(carpeta):
+    arbol = _construir(carpeta)
+    shutil.rmtree(os.path.join(carpeta, 'a', 'b', 'c'))
+    with open(os.path.join(carpeta, 'a', 'b', 'nuevo.txt'), 'wb') as f:
+        f.write(b'0' * 50)
+    
+    assert arbol.actualizar_carpeta(os.path.join(carpeta, 'a', 'b'))
+    tamaños = _tamaños(arbol, carpeta)
+    assert tamaños[os.path.join('a', 'b')] == (250, 2)
+    assert tamaños[os.path.join('a', 'b', 'c')] == (0, 0)
+    assert tamaños['a'] == (550, 3)
+    assert tamaños['.'] == (950, 4)
+    assert not arbol.actualizar_carpeta(os.path.join(carpeta, 'no_existe'))
+
+
+def test_consultar_arbol_sin_reescanear(carpeta, tmp_path, monkeypatch):
+    archivo = str(tmp_path / 'arbol.bin')
+    _construir(carpeta).guardar(archivo)
+    monkeypatch.setattr(optimizador.ArbolDirectorios.cargar.__func__, '__defaults__', (archivo,))
+    monkeypatch.setattr(optimizador, 'ultimo_arbol', None)
+    monkeypatch.setattr(optimizador, 'recorrer_archivos', None)
+    
+    resultado = optimizador.ejecutar_accion('consultar_arbol')
+    assert resultado['carpetas'][0] == {"ruta": os.path.join(carpeta, 'a'), "bytes": 600, "archivos": 3}
+    assert resultado['extensiones'][0] == {"extension": ".txt", "bytes": 500, "archivos": 2}
@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+import optimizador
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'hashes.json')
+    monkeypatch.setattr(optimizador, 'DUPLICADOS_CACHE', ruta)
+    monkeypatch.setattr(optimizador, '_cache_hashes', None)
+    return ruta
+
+
+def _escribir(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'wb') as f:
+        f.write(contenido)
+    return ruta
+
+
+def test_agrupa_por_contenido(tmp_path, cache):
+    bloque = optimizador.DUPLICADOS_BLOQUE_PARCIAL
+    a = _escribir(str(tmp_path / 'a' / 'uno.bin'), b'x' * 3 * bloque)
+    b = _escribir(str(tmp_path / 'b' / 'dos.bin'), b'x' * 3 * bloque)
+    # Mismo tamaño, inicio y final que los anteriores: solo el hash completo los separa
+    _escribir(str(tmp_path / 'c' / 'tres.bin'), b'x' * bloque + b'y' * bloque + b'x' * bloque)
+    _escribir(str(tmp_path / 'solo.bin'), b'x' * 2 * bloque)
+    
+    grupos = optimizador.buscar_duplicados([str(tmp_path)], tamaño_minimo=1)
+    assert grupos == [(3 * bloque, 3 * bloque, sorted([a, b]))]
+
+
+def test_enlaces_duros_no_son_duplicados(tmp_path, cache):
+    a = _escribir(str(tmp_path / 'a.bin'), b'z' * 4096)
+    try:
+        os.link(a, str(tmp_path / 'b.bin'))
+    except OSError:
+        pytest.skip("el sistema de archivos no admite enlaces duros")
+    assert optimizador.buscar_duplicados([str(tmp_path)], tamaño_minimo=1) == []
+
+
+def test_cache_se_fusiona_entre_busquedas(tmp_path, cache):
+    for carpeta in ('a', 'b'):
+        _escribir(str(tmp_path / carpeta / '1.bin'), b'1' * 4096)
+        _escribir(str(tmp_path / carpeta / '2.bin'), b'1' * 4096)
+    optimizador.buscar_duplicados([str(tmp_path / 'a')], tamaño_minimo=1)
+    optimizador.buscar_duplicados([str(tmp_path / 'b')], tamaño_minimo=1)
+    
+    with open(cache, encoding='utf-8') as f:
+        guardada = json.load(f)
+    assert {clave.rsplit('|', 2)[0] for clave in guardada} == {
+        str(tmp_path / carpeta / nombre) for carpeta in ('a', 'b') for nombre in ('1.bin', '2.bin')}
+    assert all('completo' in valor for valor in guardada.values())
+
+
+def test_cache_descarta_archivos_borrados_o_modificados(tmp_path, cache):
+    uno = _escribir(str(tmp_path / '1.bin'), b'1' * 4096)
+    dos = _escribir(str(tmp_path / '2.bin'), b'1' * 4096)
+    optimizador.buscar_duplicados([str(tmp_path)], tamaño_minimo=1)
+    os.remove(uno)
+    _escribir(dos, b'2' * 8192)
+    
+    optimizador.guardar_cache_hashes(optimizador.cargar_cache_hashes())
+    with open(cache, encoding='utf-8') as f:
+        assert json.load(f) == {}
@@ -0,0 +1,94 @@
+import os
+import time
+
+import optimizador
+
+
+def _crear_arbol(raiz, niveles, ramas, tamaño):
+    """Árbol completo de ramas^niveles carpetas con un archivo de tamaño bytes en cada una"""
+    os.makedirs(raiz, exist_ok=True)
+    with open(os.path.join(raiz, 'datos.bin'), 'wb') as f:
+        f.truncate(tamaño)
+    total = tamaño
+    if niveles:
+        for i in range(ramas):
+            total += _crear_arbol(os.path.join(raiz, f'd{i}'), niveles - 1, ramas, tamaño)
+    return total
+
+
+def test_estimar_total_poblacion_completa_es_exacta():
+    total, varianza, suficiente = optimizador._estimar_total([10, 20, 30], 3)
+    assert (total, varianza, suficiente) == (60, 0.0, True)
+
+
+def test_estimar_total_extrapola_la_media():
+    total, varianza, suficiente = optimizador._estimar_total([10, 30], 10)
+    assert total == 200
+    assert varianza > 0
+    assert suficiente
+
+
+def test_estimar_total_un_valor_no_es_suficiente():
+    total, varianza, suficiente = optimizador._estimar_total([50], 4)
+    assert total == 200
+    assert varianza == total ** 2
+    assert not suficiente
+
+
+def test_estimar_total_sin_valores():
+    assert optimizador._estimar_total([], 0) == (0.0, 0.0, True)
+    assert optimizador._estimar_total([], 5) == (0.0, 0.0, False)
+
+
+def test_muestrear_arbol_estima_subarboles_no_visitados(tmp_path):
+    real = _crear_arbol(str(tmp_path / 'instalador'), 5, 4, 1000)
+    bytes_est, archivos, varianza, completo = optimizador._muestrear_arbol(
+        str(tmp_path / 'instalador'), None, 12, 30, time.monotonic() + 10)
+    # Árbol regular: cada nivel muestreado representa exactamente al resto
+    assert bytes_est == real
+    assert archivos == real // 1000
+    assert completo
+
+
+def test_muestrear_arbol_exacto_si_cabe_en_el_presupuesto(tmp_path):
+    real = _crear_arbol(str(tmp_path), 2, 3, 500)
+    assert optimizador._muestrear_arbol(str(tmp_path), None, 40, 30, time.monotonic() + 10) == (real, 13, 0.0, True)
+
+
+def test_muestrear_arbol_profundo_es_cota_inferior(tmp_path):
+    real = _crear_arbol(str(tmp_path), 8, 1, 100)
+    bytes_est, _, _, completo = optimizador._muestrear_arbol(str(tmp_path), None, 3, 30, time.monotonic() + 10)
+    assert bytes_est < real
+    assert not completo
+
+
+def test_muestrear_arbol_sin_tiempo(tmp_path):
+    _crear_arbol(str(tmp_path), 1, 2, 100)
+    assert optimizador._muestrear_arbol(str(tmp_path), None, 10, 30, time.monotonic() - 1) is None
+
+
+def test_listados_se_reutilizan(tmp_path, monkeypatch):
+    _crear_arbol(str(tmp_path), 2, 2, 100)
+    listados = {}
+    optimizador._muestrear_arbol(str(tmp_path), None, 40, 30, time.monotonic() + 10, listados)
+    
+    def sin_scandir(ruta):
+        raise AssertionError(f"{ruta} se ha vuelto a leer")
+    monkeypatch.setattr(optimizador.os, 'scandir', sin_scandir)
+    assert optimizador._muestrear_arbol(str(tmp_path), None, 40, 30, time.monotonic() + 10, listados)[3]
+
+
+def test_estimar_limpieza_temporales_respeta_antigüedad(tmp_path, monkeypatch):
+    viejo = time.time() - 30 * 86400
+    real = _crear_arbol(str(tmp_path / 'instalador'), 3, 3, 1000)
+    for carpeta, subcarpetas, archivos in os.walk(tmp_path):
+        for nombre in subcarpetas + archivos:
+            os.utime(os.path.join(carpeta, nombre), (viejo, viejo))
+    with open(tmp_path / 'reciente.tmp', 'wb') as f:
+        f.truncate(5000)
+    monkeypatch.setattr(optimizador, 'obtener_directorios_temporales', lambda intensidad: [str(tmp_path)])
+    
+    bytes_est, archivos, margen, completo = optimizador.estimar_limpieza_temporales('media', 5)
+    assert bytes_est == real
+    assert margen == 0
+    assert completo
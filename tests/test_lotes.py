@@ -0,0 +1,42 @@
+import pytest
+
+import optimizador
+
+
+def test_parsear_acciones_usa_la_intensidad_por_defecto():
+    assert optimizador._parsear_acciones(['limpieza_temporales:alta', 'vaciar_papelera'], 'media') == [
+        ('limpieza_temporales', 'alta'), ('vaciar_papelera', 'media')]
+
+
+def test_parsear_acciones_rechaza_intensidades_desconocidas():
+    with pytest.raises(ValueError):
+        optimizador._parsear_acciones(['limpieza_temporales:maxima'], 'media')
+
+
+def test_main_lote_informa_de_la_intensidad_no_valida(capsys):
+    with pytest.raises(SystemExit) as salida:
+        optimizador.main_lote(['--acciones', 'limpieza_temporales:alto'])
+    assert salida.value.code == 2
+    assert "intensidad no válida" in capsys.readouterr().err
+
+
+def test_main_lote_rechaza_cuarentena_en_modo_residente(capsys):
+    with pytest.raises(SystemExit):
+        optimizador.main_lote(['--residente', '--cuarentena'])
+    assert "--cuarentena" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("texto, ok", [
+    ("Optimizados: 3, Errores: 0", True),
+    ("Error: acceso denegado", False),
+    ("Error al abrir la clave", False),
+])
+def test_resultado_texto(texto, ok):
+    assert optimizador._resultado_texto(texto) == {"resultado": texto, "ok": ok}
+
+
+def test_ejecutar_lote_marca_errores(monkeypatch):
+    monkeypatch.setattr(optimizador, 'configurar_alto_rendimiento', lambda: "Error: sin permisos")
+    resultados = optimizador.ejecutar_lote([('configurar_alto_rendimiento', 'media'), ('desconocida', 'media')])
+    assert [r["ok"] for r in resultados] == [False, False]
+    assert "no reconocida" in resultados[1]["error"]